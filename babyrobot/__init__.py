@@ -17,6 +17,12 @@ register(
     entry_point='babyrobot.envs:BabyRobot_v0',
 )
 
+register(
+    id='BabyRobotVector-v0',
+    entry_point='babyrobot.envs:BabyRobotVectorEnv',
+    disable_env_checker=True,
+)
+
 
 #
 # Example Gym Environments
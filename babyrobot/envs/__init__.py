@@ -10,6 +10,7 @@ os.environ["JUPYTER_PLATFORM_DIRS"] = "1"
 
 from .baby_robot_interface import BabyRobotInterface
 from .baby_robot_v0 import BabyRobot_v0
+from .baby_robot_vector_env import BabyRobotVectorEnv
 
 
 
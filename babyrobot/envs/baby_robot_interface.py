@@ -3,7 +3,7 @@
 
 import gymnasium
 import numpy as np
-import random
+from gymnasium.utils import seeding
 
 from .lib.grid_level import GridLevel
 from .lib.graphical_grid_level import GraphicalGridLevel
@@ -17,18 +17,27 @@ from .lib.actions import Actions
 class BabyRobotInterface(gymnasium.Env):
     ''' Baby Robot Gym Environment Base Class '''
 
+    steps = 0                     # the number of steps taken since the last reset
+    max_episode_steps = None      # the number of steps after which an episode is truncated
+
     def __init__(self, **kwargs):
         super().__init__()
 
-        # initialize the random seed to allow exact recreation of levels
-        self.set_seed(kwargs.get('seed',None))
-
         # get the rendering mode
         self.render_mode = kwargs.get('render_mode',None)
 
         # initially no actions are available      
         self.dynamic_action_space = Dynamic()          
 
+        # uniform random numbers used to choose the outcome of actions
+        # - these are drawn from the environment's generator in blocks
+        self.uniform_block_size = kwargs.get('uniform_block_size',1024)
+        self.uniforms = np.zeros(0)
+        self.uniform_index = 0
+
+        # initialize the random seed to allow exact recreation of episodes
+        self.set_seed(kwargs.get('seed',None))
+
         # dimensions of the grid
         self.width = kwargs.get('width',3)
         self.height = kwargs.get('height',3)      
@@ -46,10 +55,18 @@ class BabyRobotInterface(gymnasium.Env):
         # - by default this is the grid start         
         self.set_initial_pos( kwargs.get('initial_pos',self.start) )     
         
+        # test if the lean, headless, stepping path should be used
+        # - this is only possible when there's no rendering
+        self.fast_mode = kwargs.get('fast_mode',False) and (self.render_mode is None)
+
         # creation of the level
         if self.render_mode is None:        
           self.level = GridLevel( **kwargs )           
-          self.robot = Robot(self.level,**kwargs)   
+
+          # in fast mode the position is never passed to the robot
+          self.robot = None if self.fast_mode else Robot(self.level,**kwargs)
+          if self.fast_mode:
+            self.setup_fast_mode()
         else:
           # graphical creation of the level
           self.level = GraphicalGridLevel( **kwargs )           
@@ -65,10 +82,123 @@ class BabyRobotInterface(gymnasium.Env):
     #   
      
     def set_seed(self, seed = None):
-      ''' initialize the random seed to allow exact recreation of levels '''
+      ''' initialize the environment's random number generators to allow exact recreation of episodes
+          - this gives the environment, and its action space, their own generators rather than
+            using the global 'random' and 'np.random' state
+      '''
       if seed is not None:        
-        random.seed(seed)
-        np.random.seed(seed=seed)
+        self._np_random, _ = seeding.np_random(seed)
+        self.dynamic_action_space.seed(seed)
+
+        # the action space may be a separate 'Discrete' space, which also needs its own generator
+        action_space = getattr(self,'action_space',None)
+        if action_space is not None and action_space is not self.dynamic_action_space:
+          action_space.seed(seed)
+
+        # discard any random numbers drawn from the previous generator
+        self.uniforms = np.zeros(0)
+        self.uniform_index = 0
+
+
+    def reset(self, seed=None, options=None):
+        ''' reseed the environment if a seed is supplied '''
+        super().reset(seed=seed)
+        self.set_seed(seed)
+
+
+    def get_uniform(self):
+      ''' return the next uniform random number from the environment's generator
+          - numbers are drawn in blocks, which gives exactly the same sequence as drawing them one at a time
+      '''
+      if self.uniform_index >= len(self.uniforms):
+        self.uniforms = self.np_random.random(self.uniform_block_size)
+        self.uniform_index = 0
+      u = self.uniforms[self.uniform_index]
+      self.uniform_index += 1
+      return u
+
+
+    def get_uniforms(self, n):
+      ''' return the next 'n' uniform random numbers from the environment's generator in a single array
+          - these continue the sequence returned by 'get_uniform', so a whole rollout's random
+            numbers can be drawn in one call
+      '''
+      uniforms = self.peek_uniforms(n).copy()
+      self.uniform_index += n
+      return uniforms
+
+
+    def peek_uniforms(self, n):
+      ''' return a view of the next 'n' uniform random numbers without using them up
+          - advance 'uniform_index' by the number that are actually used
+      '''
+      remaining = len(self.uniforms) - self.uniform_index
+      if remaining < n:
+        new_uniforms = self.np_random.random(max(n - remaining, self.uniform_block_size))
+        self.uniforms = np.concatenate((self.uniforms[self.uniform_index:], new_uniforms))
+        self.uniform_index = 0
+      return self.uniforms[self.uniform_index:self.uniform_index + n]
+
+    def setup_fast_mode(self):
+      ''' precompute the tables used by the lean stepping path
+
+          - the transition model is converted to Python lists, which are quicker to index
+            for single values than NumPy arrays
+          - the list of available actions and the action mask for each state are created once
+          - observations are written into a single preallocated buffer and the info dictionary
+            is reused, so both are overwritten by the next call to 'step' or 'reset'
+      '''
+      model = self.level.get_transition_model()
+      self.next_state_table = model.next_states.tolist()
+      self.reward_table = model.rewards.tolist()
+      self.cumulative_table = model.cumulative.tolist()
+
+      # the mask and list of the actions available in each state
+      directions = self.level.get_cached_directions().reshape(-1)
+      self.action_mask_table = (directions[:,None] & model.action_directions[None,:]) > 0
+      self.action_mask_table[:,0] = True
+      self.action_list_table = [Direction.get_action_list(direction) for direction in directions]
+
+      self.observation = np.zeros(2,dtype=int)
+      self.info = {'target_reached': False}
+
+
+    def take_fast_action(self, action):
+        ''' apply the supplied action using the precomputed tables of the lean stepping path
+
+            returns:
+            - the reward obtained for taking the action
+            - a flag to indicate if the target state was reached
+        '''
+        state = (self.y * self.width) + self.x
+
+        # sample the outcome of the action from the cumulative probabilities
+        u = self.get_uniform()
+        cumulative = self.cumulative_table[state][action]
+        outcome = 0
+        while cumulative[outcome] <= u:
+          outcome += 1
+
+        # store the new position
+        next_state = self.next_state_table[state][outcome]
+        self.y, self.x = divmod(next_state, self.width)
+
+        # update the available actions for the new position
+        self.dynamic_action_space.set_actions( self.action_list_table[next_state] )
+        return self.reward_table[state][action][outcome], (outcome == action)
+
+
+    def action_masks( self ):
+        ''' return a boolean array, in the order of the 'Actions' enum, of the actions
+            available in the current state
+            - staying in the same state is always possible
+            - in fast mode this is a view of a precomputed table, otherwise it's calculated
+        '''
+        if self.fast_mode:
+          return self.action_mask_table[(self.y * self.width) + self.x]
+        direction_value = self.level.get_directions(self.x,self.y)
+        return np.array([True] + [(direction_value & Direction.from_action(action)) > 0 for action in range(1,len(Actions))])
+
 
     def take_action(self, action):
         ''' apply the supplied action 
@@ -83,7 +213,7 @@ class BabyRobotInterface(gymnasium.Env):
         direction = Direction.from_action(action)  
           
         # calculate the postion of the next state and the reward for moving there
-        next_pos,reward,target_reached = self.level.get_next_state( self.x, self.y, direction )  
+        next_pos,reward,target_reached = self.level.get_next_state( self.x, self.y, direction, self.get_uniform() )  
 
         # store the new position
         self.x = next_pos[0]
@@ -94,6 +224,75 @@ class BabyRobotInterface(gymnasium.Env):
         return reward, target_reached  
 
 
+    def step_many(self, actions):
+        ''' take each of the supplied actions in turn, stopping early if the episode terminates
+            or is truncated
+
+            This gives exactly the same results as calling 'step' for each action, but without
+            creating an observation and info dictionary on every step.
+
+            returns NumPy arrays, with one entry for each action taken, of:
+            - the observations (the [x,y] position after each action)
+            - the rewards
+            - the 'terminated' flags
+            - the 'truncated' flags
+            - the 'target_reached' flags
+        '''
+        actions = np.asarray(actions, dtype=int).reshape(-1)
+        num_actions = len(actions)
+
+        model = self.level.get_transition_model()
+        cumulative = model.cumulative
+        next_states = model.next_states
+        reward_table = model.rewards
+        end_state = model.get_state( self.end[0], self.end[1] )
+
+        states = np.zeros(num_actions,dtype=int)
+        rewards = np.zeros(num_actions)
+        terminated = np.zeros(num_actions,dtype=bool)
+        truncated = np.zeros(num_actions,dtype=bool)
+        target_reached = np.zeros(num_actions,dtype=bool)
+
+        # the random numbers that would be used by the equivalent calls to 'step'
+        uniforms = self.peek_uniforms(num_actions)
+
+        state = model.get_state( self.x, self.y )
+        steps = self.steps
+        num_taken = 0
+        for index in range(num_actions):
+          action = actions[index]
+          outcome = int(cumulative[state,action].searchsorted(uniforms[index], side='right'))
+          rewards[index] = reward_table[state,action,outcome]
+          target_reached[index] = (outcome == action)
+          state = next_states[state,outcome]
+          states[index] = state
+
+          # increment the number of steps taken since the last reset
+          # - if this is greater than the maximum allowed for the episode set the 'truncated' flag
+          steps += 1
+          truncated[index] = False if self.max_episode_steps is None else (steps > self.max_episode_steps)
+
+          # set the 'terminated' flag if we've reached the exit or the episode is truncated
+          terminated[index] = (state == end_state) or truncated[index]
+
+          num_taken += 1
+          if terminated[index]:
+            break
+
+        # only the random numbers for the actions that were taken are used up
+        self.uniform_index += num_taken
+        self.steps = steps
+
+        # store the final position and update the available actions
+        self.y, self.x = (int(value) for value in divmod(state, self.width))
+        self.set_available_actions()
+
+        states = states[:num_taken]
+        observations = np.stack((states % self.width, states // self.width), axis=1)
+        return (observations, rewards[:num_taken], terminated[:num_taken],
+                truncated[:num_taken], target_reached[:num_taken])
+
+
     def get_available_actions( self, x = None, y = None ):
         ''' test which actions are allowed at the specified grid state '''
 
@@ -110,6 +309,9 @@ class BabyRobotInterface(gymnasium.Env):
               
     def set_available_actions( self ):
         ' set the list of available actions into the action space '
+        if self.fast_mode:
+          self.dynamic_action_space.set_actions( self.action_list_table[(self.y * self.width) + self.x] )
+          return
         action_list = self.get_available_actions()   
         self.dynamic_action_space.set_actions( action_list )      
 
@@ -123,8 +325,8 @@ class BabyRobotInterface(gymnasium.Env):
     def get_transition_probability( self, x = None, y = None, direction: Direction = None ):
         ''' get the probability of moving to the intended target when in the specified cell '''
         # if no coordinate supplied use the current position
-        if not x: x = self.x
-        if not y: y = self.y      
+        if x is None: x = self.x
+        if y is None: y = self.y
         probability, barrier = self.level.grid_base.get_transition_probability( x, y, direction )
         return probability, barrier
     
@@ -132,7 +334,11 @@ class BabyRobotInterface(gymnasium.Env):
        ''' for an action in a state, return the list of possible next states and rewards 
            and the accompanying probability for each = p(s',r|s,a)
        '''
-       return self.level.get_action_probabilities( x, y, action )        
+       return self.level.get_action_probabilities( x, y, action )
+
+    def get_transition_model( self ):
+       ''' return the compiled transition probability, next state and reward tables of the level '''
+       return self.level.get_transition_model()
 
 
     def get_reward( self, x, y, direction = None ):
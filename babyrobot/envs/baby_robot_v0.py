@@ -2,7 +2,6 @@
 # Distributed under the terms of the Modified BSD License.
 
 
-import random
 import numpy as np
 from gymnasium.spaces import Discrete, MultiDiscrete
 from .baby_robot_interface import BabyRobotInterface
@@ -32,6 +31,10 @@ class BabyRobot_v0( BabyRobotInterface ):
           # - there are 5 possible actions: move N,E,S,W or stay in same state
           self.action_space = Discrete(5)
 
+          # the action space is created after the environment is seeded, so is seeded here
+          if kwargs.get('seed',None) is not None:
+            self.action_space.seed(kwargs['seed'])
+
         # the observation will be the coordinates of Baby Robot
         self.observation_space = MultiDiscrete([self.width, self.height])
 
@@ -53,6 +56,9 @@ class BabyRobot_v0( BabyRobotInterface ):
                 Can be used to end the episode prematurely before a `terminal state` is reached.
 
         '''
+        if self.fast_mode:
+          return self.fast_step(action)
+
         reward, target_reached = self.take_action(action)
         obs = np.array([self.x,self.y])
 
@@ -76,10 +82,36 @@ class BabyRobot_v0( BabyRobotInterface ):
           return obs, reward, terminated, truncated, info
 
 
+    def fast_step(self, action):
+        ''' the lean, headless, version of 'step' used when 'fast_mode' is set
+
+            - the observation is written into a preallocated buffer and the info dictionary
+              is reused, so both are overwritten by the next step. Copy them if they need to be kept
+            - the robot object isn't created or moved
+        '''
+        reward, target_reached = self.take_fast_action(action)
+        obs = self.observation
+        obs[0] = self.x
+        obs[1] = self.y
+
+        self.steps += 1
+        truncated = False if self.max_episode_steps is None else (self.steps > self.max_episode_steps)
+        terminated = (self.x == self.end[0]) and (self.y == self.end[1])
+        if truncated: terminated = True
+
+        info = self.info
+        info['target_reached'] = target_reached
+
+        if self.apply_api_compatibility:
+          return obs, reward, terminated, info
+        return obs, reward, terminated, truncated, info
+
+
     def render(self, mode='human', info=None ):
         ''' render as an HTML5 canvas '''
         # move baby robot to the current position
-        self.robot.move(self.x,self.y)
+        if self.robot is not None:
+          self.robot.move(self.x,self.y)
 
         if self.render_mode is not None:
           # write the info to the grid side-panel
@@ -90,17 +122,23 @@ class BabyRobot_v0( BabyRobotInterface ):
     def reset(self, seed=None, return_info=False, options=None):
         ''' reset Baby Robot's position in the grid '''
         super().reset(seed=seed)
-        if seed is not None:
-           random.seed(seed)
 
         # the number of steps taken since the last reset
         self.steps = 0
 
-        self.robot.set_cell_position(self.initial_pos)
+        if self.robot is not None:
+          self.robot.set_cell_position(self.initial_pos)
         if self.render_mode is not None:
           self.robot.reset()
         self.x = self.initial_pos[0]
         self.y = self.initial_pos[1]
         self.set_available_actions()
         info = {}
+
+        if self.fast_mode:
+          # write the position into the preallocated observation buffer
+          self.observation[0] = self.x
+          self.observation[1] = self.y
+          return self.observation,info
+
         return np.array([self.x,self.y]),info
\ No newline at end of file
@@ -0,0 +1,201 @@
+# Copyright (c) Steve Roberts
+# Distributed under the terms of the Modified BSD License.
+
+
+import numpy as np
+from gymnasium.spaces import Discrete, MultiDiscrete
+from gymnasium.utils import seeding
+from gymnasium.vector import VectorEnv
+
+from .lib.grid_level import GridLevel
+
+
+class BabyRobotVectorEnv( VectorEnv ):
+    ''' Vectorized Baby Robot Gym Environment
+
+        Runs 'num_envs' copies of the same level, with the positions, step counts and
+        random number generation of every copy held in NumPy arrays. All copies share a
+        single compiled transition model, so one call to 'step' moves every robot.
+
+        - there is no graphical rendering
+        - each copy uses a Discrete(5) action space. Actions that aren't possible in the
+          current state leave the robot where it is (use 'action_masks' to find the
+          available actions)
+        - copies that reach the exit, or exceed 'max_steps', are automatically reset. The
+          observation and info of their last step are returned in the info dictionary, under
+          'final_observation' and 'final_info', as done by the gymnasium vector environments
+    '''
+
+    metadata = {'render_modes': [], 'autoreset': True}
+
+    def __init__(self, num_envs=1, **kwargs):
+
+        # graphical rendering isn't supported
+        kwargs.pop('render_mode',None)
+        self.render_mode = None
+
+        self.width = kwargs.get('width',3)
+        self.height = kwargs.get('height',3)
+
+        # the start and end positions in the grid
+        # - by default these are the top-left and bottom-right respectively
+        self.start = kwargs.get('start',[0,0])
+        self.end = kwargs.get('end',[self.width-1,self.height-1])
+        self.initial_pos = kwargs.get('initial_pos',self.start)
+
+        self.max_episode_steps = kwargs.get('max_steps', None)
+
+        # create and compile the level shared by all copies of the environment
+        self.level = GridLevel( **kwargs )
+        self.model = self.level.get_transition_model()
+        self.initial_state = self.model.get_state( self.initial_pos[0], self.initial_pos[1] )
+        self.end_state = self.model.get_state( self.end[0], self.end[1] )
+
+        # the actions available in each state
+        # - staying in the same state is always possible
+        directions = self.level.get_cached_directions().reshape(-1)
+        self.available_actions = (directions[:,None] & self.model.action_directions[None,:]) > 0
+        self.available_actions[:,0] = True
+
+        # the observation will be the coordinates of Baby Robot
+        super().__init__( num_envs, MultiDiscrete([self.width, self.height]), Discrete(5) )
+
+        # the current state and number of steps taken by each copy of the environment
+        self.states = np.full(self.num_envs, self.initial_state)
+        self.steps = np.zeros(self.num_envs, dtype=int)
+        self.actions = np.zeros(self.num_envs, dtype=int)
+
+        self._np_random, _ = seeding.np_random( kwargs.get('seed',None) )
+
+        # the generators of each copy of the environment, used once a list of seeds has been supplied
+        # - the uniform random numbers of each copy are drawn in blocks, one row per copy
+        self.uniform_block_size = kwargs.get('uniform_block_size',1024)
+        self.env_generators = None
+        self.uniforms = np.zeros((self.num_envs,0))
+        self.uniform_index = 0
+
+
+    #
+    # Helper Methods
+    #
+
+    def get_observations(self, states):
+        ''' convert an array of states into an array of [x,y] coordinates '''
+        return np.stack((states % self.width, states // self.width), axis=1)
+
+
+    def action_masks(self):
+        ''' return a (num_envs,5) boolean array of the actions available to each copy of the environment '''
+        return self.available_actions[self.states]
+
+
+    def seed_environments(self, seeds):
+        ''' give each copy of the environment its own generator, created from its entry in the list of seeds
+            - a copy with a seed of None keeps its current generator (or, if it doesn't yet have one,
+              is given a generator created from the shared generator)
+        '''
+        seeds = list(seeds)
+        if len(seeds) != self.num_envs:
+          raise Exception(f"Expected {self.num_envs} seeds but {len(seeds)} were supplied")
+
+        if self.env_generators is None:
+          self.env_generators = [np.random.Generator(np.random.PCG64(int(self.np_random.integers(2**63))))
+                                 for index in range(self.num_envs)]
+          self.uniforms = np.zeros((self.num_envs,0))
+          self.uniform_index = 0
+
+        for index, seed in enumerate(seeds):
+          if seed is not None:
+            self.env_generators[index], _ = seeding.np_random(int(seed))
+
+            # replace the unused random numbers of the copy with those of its new generator
+            remaining = self.uniforms.shape[1] - self.uniform_index
+            self.uniforms[index,self.uniform_index:] = self.env_generators[index].random(remaining)
+
+
+    def get_uniforms(self):
+        ''' return one uniform random number for each copy of the environment
+            - once a list of seeds has been supplied each copy draws from its own generator,
+              so gives the same sequence as a single environment with the same seed
+        '''
+        if self.env_generators is None:
+          return self.np_random.random(self.num_envs)
+
+        if self.uniform_index >= self.uniforms.shape[1]:
+          self.uniforms = np.stack([generator.random(self.uniform_block_size) for generator in self.env_generators])
+          self.uniform_index = 0
+        u = self.uniforms[:,self.uniform_index]
+        self.uniform_index += 1
+        return u
+
+
+    #
+    # Gym Vector Interface Methods
+    #
+
+    def reset_wait(self, seed=None, options=None):
+        ''' reset the position of every copy of Baby Robot '''
+        if seed is not None:
+          if isinstance(seed, (int, np.integer)):
+            # a single seed for the generator shared by all copies
+            self._np_random, _ = seeding.np_random(int(seed))
+            self.env_generators = None
+          else:
+            # a list of seeds, one per environment
+            self.seed_environments(seed)
+
+        self.states[:] = self.initial_state
+        self.steps[:] = 0
+        return self.get_observations(self.states), {}
+
+
+    def step_async(self, actions):
+        ''' store the actions to be taken in each copy of the environment '''
+        self.actions = np.asarray(actions, dtype=int).reshape(self.num_envs)
+
+
+    def step_wait(self):
+        ''' move every copy of Baby Robot by sampling from the compiled transition model '''
+        model = self.model
+        states = self.states
+        actions = self.actions
+
+        # sample the outcome of each action from the cumulative probabilities
+        u = self.get_uniforms()
+        cumulative = model.cumulative[states,actions]
+        outcomes = np.sum(cumulative <= u[:,None], axis=1)
+
+        rewards = model.rewards[states,actions,outcomes]
+        target_reached = (outcomes == actions)
+        self.states = model.next_states[states,outcomes]
+
+        # increment the number of steps taken since the last reset
+        # - if this is greater than the maximum allowed for the episode set the 'truncated' flag
+        self.steps += 1
+        terminated = (self.states == self.end_state)
+        if self.max_episode_steps is None:
+          truncated = np.zeros(self.num_envs, dtype=bool)
+        else:
+          truncated = (self.steps > self.max_episode_steps)
+
+        observations = self.get_observations(self.states)
+        infos = {'target_reached': target_reached, '_target_reached': np.ones(self.num_envs, dtype=bool)}
+
+        # reset any environments that have finished their episode
+        done = terminated | truncated
+        if np.any(done):
+          final_observation = np.full(self.num_envs, None, dtype=object)
+          final_info = np.full(self.num_envs, None, dtype=object)
+          for index in np.flatnonzero(done):
+            final_observation[index] = observations[index].copy()
+            final_info[index] = {'target_reached': bool(target_reached[index])}
+          infos['final_observation'] = final_observation
+          infos['_final_observation'] = done
+          infos['final_info'] = final_info
+          infos['_final_info'] = done
+
+          self.states[done] = self.initial_state
+          self.steps[done] = 0
+          observations[done] = self.get_observations(self.states[done])
+
+        return observations, rewards, terminated, truncated, infos
@@ -115,6 +115,13 @@ class Direction(IntFlag):
       return Direction.Stay
 
 
+    def to_action( direction ) -> Actions:
+      ''' convert a single direction value to an action '''
+      if direction == Direction.Stay:
+        return Actions.Stay
+      return Actions(int(direction).bit_length())
+
+
     def from_actions( action_values: Actions):
       ''' convert an array of action values to a direction bitfield '''
       dir_value = 0
@@ -1,18 +1,18 @@
 from argparse import Action
 import gymnasium
-import numpy as np
 from .actions import Actions
 
 class Dynamic(gymnasium.Space):
 
-  def __init__(self, action_list = []):
+  def __init__(self, action_list = [], seed = None):
       ' set the list of initially available actions '
+      super().__init__(seed=seed)
       self.set_actions(action_list)
 
   def sample(self):
       ' select a random action from the set of available actions '
       if len(self.available_actions) > 0:
-        return np.random.choice(self.available_actions)
+        return self.np_random.choice(self.available_actions)
       return Actions.Stay
 
   def set_actions(self,actions):
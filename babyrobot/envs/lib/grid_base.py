@@ -14,9 +14,11 @@ class Puddle(IntEnum):
 class GridBase():
 
   maze = None                # instance of maze if defined
-  puddles = None             # set of tiles where puddles exist
-  base_areas = []            # any areas that exist on the base
-  grid_areas = []            # and areas that exist on the grid
+  _puddles = None            # set of tiles where puddles exist
+  _base_areas = []           # any areas that exist on the base
+  _grid_areas = []           # and areas that exist on the grid
+
+  layout_version = 0         # incremented whenever the walls or areas change
 
   debug_maze = False         # write the maze to a svg file
 
@@ -40,16 +42,12 @@ class GridBase():
     self.start = kwargs.get('start',[0,0])
     self.end = kwargs.get('end',[self.width-1,self.height-1])
 
+    # setup up any properties defined for the puddles
+    self.set_puddle_props( kwargs.get('puddle_props',{}) )
+
     # setup any puddles
     self.puddles = kwargs.get('puddles',None)
 
-    # setup up any properties defined for the puddles
-    puddle_props = kwargs.get('puddle_props',{})
-    self.large_puddle_reward = puddle_props.get('large_reward',-4)
-    self.small_puddle_reward = puddle_props.get('small_reward',-2)
-    self.large_puddle_probability = puddle_props.get('large_prob',0.4)
-    self.small_puddle_probability = puddle_props.get('small_prob',0.6)
-
     # setup any base-level areas
     self.base_areas = kwargs.get('base_areas',[])
 
@@ -59,6 +57,7 @@ class GridBase():
     # setup any maze and walls
     self.add_maze = kwargs.get('add_maze',False)
     self.maze_seed = kwargs.get('maze_seed',0)
+    self.maze_algorithm = kwargs.get('maze_algorithm','backtracker')
     self.make_maze()
     self.toggle_walls( kwargs.get('walls',[]) )
 
@@ -74,7 +73,7 @@ class GridBase():
     if self.add_maze:
       if self.maze is None:
         self.maze = Maze(self.width, self.height, self.start[0], self.start[1], seed = self.maze_seed)
-        self.maze.make_maze()
+        self.maze.make_maze(self.maze_algorithm)
       if self.debug_maze:
         self.maze.write_svg(os.path.join(self.working_directory, "maze.svg"))
 
@@ -99,35 +98,99 @@ class GridBase():
         if x >= self.width or y >= self.height:
           break
 
-        current_cell = self.maze.cell_at(x,y)
-        if   direction == 'E': next_cell = self.maze.cell_at(x+1,y)
-        elif direction == 'W': next_cell = self.maze.cell_at(x-1,y)
-        elif direction == 'N': next_cell = self.maze.cell_at(x,y-1)
-        elif direction == 'S': next_cell = self.maze.cell_at(x,y+1)
-
         # add a new wall if none already otherwise remove
-        current_cell.toggle_wall(next_cell, direction, props[0] if props else {})
+        # - the matching wall of the neighbouring cell is also changed
+        self.maze.toggle_wall(x, y, direction, props[0] if props else {})
 
         # move to the next cell for wall repeated across multiple cells
         if direction == 'E' or direction == 'W': y += 1
         else: x += 1
 
+    # any information calculated from the walls is now out of date
+    self.layout_changed()
+
+
+  def layout_changed(self):
+    ''' record that the walls or areas of the grid have changed '''
+    self.layout_version += 1
+
 
   '''
       Puddles
   '''
 
+  @property
+  def puddles(self):
+    ''' the puddles, as supplied to the level
+        - either a list of ((x,y),size) pairs or a list of rows giving the size of the puddle in each cell
+    '''
+    return self._puddles
+
+  @puddles.setter
+  def puddles(self, puddles):
+    self._puddles = puddles
+    self.puddle_grid = self.get_puddle_grid( puddles )
+    self.grid_changed()
+
+
+  def set_puddle_props( self, puddle_props: dict ):
+    ''' set the reward for moving into, and probability of moving out of, each size of puddle
+        - any property that isn't supplied is given its default value
+    '''
+    self.puddle_props = dict(puddle_props)
+    self.large_puddle_reward = puddle_props.get('large_reward',-4)
+    self.small_puddle_reward = puddle_props.get('small_reward',-2)
+    self.large_puddle_probability = puddle_props.get('large_prob',0.4)
+    self.small_puddle_probability = puddle_props.get('small_prob',0.6)
+    self.grid_changed()
+
+
+  def get_puddle_grid( self, puddles ) -> np.ndarray:
+    ''' convert either format of puddle definition into a (height,width) int8 array of puddle sizes '''
+    puddle_grid = np.zeros((self.height,self.width),dtype=np.int8)
+    if puddles:
+      if isinstance(puddles[0],list):
+        rows = np.array(puddles,dtype=np.int8)
+        puddle_grid[:rows.shape[0],:rows.shape[1]] = rows[:self.height,:self.width]
+      else:
+        # work backwards so that the first puddle defined for a cell is the one used
+        for (px,py),puddle_size in reversed(puddles):
+          if (0 <= px < self.width) and (0 <= py < self.height):
+            puddle_grid[py,px] = puddle_size
+    return puddle_grid
+
+
   def get_puddle_size( self, x, y ):
     ''' get the size of the puddle at the supplied location '''
-    if self.puddles is not None:
-      if isinstance(self.puddles[0],list):
-        return Puddle(self.puddles[y][x])
-      else:
-        for (px,py),puddle_size in self.puddles:
-          if x==px and y==py:
-            return Puddle(puddle_size)
+    return Puddle(self.puddle_grid[y,x])
+
+
+  def get_puddle_sizes( self ) -> np.ndarray:
+    ''' return a (height,width) array of the puddle size in every grid cell '''
+    return self.puddle_grid
+
 
-    return Puddle.Dry
+  def get_puddle_probabilities( self ) -> np.ndarray:
+    ''' return a (height,width) array of the probability of successfully moving out of each
+        grid cell, as a result of any puddle in the cell
+    '''
+    probabilities = np.ones((self.height,self.width))
+    probabilities[self.puddle_grid == Puddle.Small] = self.small_puddle_probability
+    probabilities[self.puddle_grid == Puddle.Large] = self.large_puddle_probability
+    return probabilities
+
+
+  def get_puddle_rewards( self ) -> np.ndarray:
+    ''' return a (height,width) array of the reward for moving into each grid cell, as a result
+        of any puddle in the cell
+        - no puddle = -1
+        - small puddle = -2
+        - large puddle = -4
+    '''
+    rewards = np.full((self.height,self.width),-1.0)
+    rewards[self.puddle_grid == Puddle.Small] = self.small_puddle_reward
+    rewards[self.puddle_grid == Puddle.Large] = self.large_puddle_reward
+    return rewards
 
 
   def get_transition_probability( self, x, y, direction: Direction = None ):
@@ -142,8 +205,7 @@ class GridBase():
     # when moving in that direction from the current state
     # - only relevant if a maze is defined and a probabilistic wall exists
     if (self.maze is not None) and (direction is not None):
-        current_cell = self.maze.cell_at(x,y)
-        probability, barrier = current_cell.get_probability( Direction.get_direction_char(direction) )             
+        probability, barrier = self.maze.get_probability( x, y, Direction.get_direction_char(direction) )             
 
     puddle_size = self.get_puddle_size( x, y )
     if puddle_size == Puddle.Large:   probability *= self.large_puddle_probability
@@ -152,6 +214,22 @@ class GridBase():
     return probability, barrier
 
 
+  def get_transition_probabilities( self ):
+    ''' return arrays of the transition probability and barrier flag for moving from
+        every grid cell in the direction of each action
+        - both arrays are (height,width,5), with the last axis in the order of the 'Actions' enum
+    '''
+    probabilities = np.ones((self.height,self.width,5))
+    barriers = np.zeros((self.height,self.width,5),dtype=bool)
+    if self.maze is not None:
+      # the maze gives the wall probabilities in the order N,E,S,W, which matches the 'Actions' enum
+      probabilities[:,:,1:], barriers[:,:,1:] = self.maze.get_probabilities()
+
+    # reduce the probability of reaching the target when moving out of a puddle
+    probabilities[:,:,1:] *= self.get_puddle_probabilities()[:,:,None]
+    return probabilities, barriers
+
+
   def get_reward( self, x: int = None, y: int = None ) -> Union[int,np.ndarray]:
     ''' return the reward for the specified grid cell '''
     if (x is None) or (y is None):
@@ -164,13 +242,22 @@ class GridBase():
     ''' return a numpy array containing the reward value for all grid cells '''
 
     if len(self.grid_rewards) == 0:
-      height = self.height
-      width = self.width
-      reward_arr = np.zeros((height,width)).astype(int)
-      for y in range(height):
-        for x in range(width):
-          reward_arr[y][x] = self.get_reward_value(x,y)
-      return reward_arr
+      # if any grid areas exist these can set different rewards
+      reward_arr = np.full((self.height,self.width),-1.0)
+      area_rewards = np.array([area[2] if len(area) > 2 else -1 for area in self.grid_areas],dtype=float)
+      in_area = self.grid_area_labels >= 0
+      reward_arr[in_area] = area_rewards[self.grid_area_labels[in_area]]
+
+      # moving to the terminal state takes one time period and therefore has a reward of -1
+      reward_arr[self.end[1],self.end[0]] = -1
+
+      # no rewards exist off the grid
+      reward_arr[self.get_base_area_mask()] = 0
+
+      # the reward for moving into a puddle replaces all other rewards
+      puddles = self.puddle_grid != Puddle.Dry
+      reward_arr[puddles] = self.get_puddle_rewards()[puddles]
+      return reward_arr.astype(int)
 
     # grid rewards already calculated
     return self.grid_rewards
@@ -178,17 +265,9 @@ class GridBase():
 
   def test_for_base_area( self, x, y ):
     ''' test if the specified cell is in a base area '''
-    for area in self.base_areas:
-      # test if only the area defn has been supplied
-      if type(area[0]).__name__ == 'int':
-        ax,ay,aw,ah = self.get_area_defn(area)
-      else:
-        ax,ay,aw,ah = self.get_area_defn(area[0])
-      
-      if self.in_area(x,y,ax,ay,aw,ah):
-        return True
-        
-    return False
+    if (x < 0) or (x >= self.width) or (y < 0) or (y >= self.height):
+      return False
+    return self.base_area_labels[y,x] >= 0
 
 
   def get_reward_value( self, x, y ):
@@ -227,22 +306,76 @@ class GridBase():
     # if any grid areas exist these can set different rewards
     # - the most recently defined area is the one whose reward will be taken
     # for a cell
-    cell_reward = -1
-    for area in self.grid_areas:
-      if len(area) > 2:
-        try:
-          ax,ay,aw,ah = self.get_area_defn(area[0])
-          if self.in_area( x,y,ax,ay,aw,ah ):
-            cell_reward = area[2]
-        except:
-          pass
+    area_index = self.grid_area_labels[y,x]
+    if area_index >= 0:
+      return self.grid_areas[area_index][2]
 
-    return cell_reward
+    return -1
 
   '''
      Areas
   '''
 
+  @property
+  def base_areas(self):
+    ''' the areas that exist on the base, off the grid '''
+    return self._base_areas
+
+  @base_areas.setter
+  def base_areas(self, areas):
+    self._base_areas = areas
+    self.base_area_labels = self.get_area_labels( areas )
+    self.grid_changed()
+
+  @property
+  def grid_areas(self):
+    ''' the areas that exist on the grid '''
+    return self._grid_areas
+
+  @grid_areas.setter
+  def grid_areas(self, areas):
+    self._grid_areas = areas
+    self.grid_area_labels = self.get_area_labels( areas, with_reward = True )
+    self.grid_changed()
+
+
+  def grid_changed(self):
+    ''' update any information that depends on the areas or puddles '''
+    # recalculate the rewards if these have already been set
+    if len(self.grid_rewards) > 0:
+      self.grid_rewards = []
+      self.grid_rewards = self.get_reward()
+    self.layout_changed()
+
+
+  def get_area_labels( self, areas, with_reward = False ) -> np.ndarray:
+    ''' rasterize a list of areas into a (height,width) array giving, for each cell,
+        the index of the last area that contains the cell (or -1 if it's in no area)
+        - if 'with_reward' is set only the areas that define a reward are included
+    '''
+    labels = np.full((self.height,self.width),-1,dtype=np.int32)
+    for index,area in enumerate(areas):
+      try:
+        if with_reward:
+          if len(area) <= 2: continue
+          ax,ay,aw,ah = self.get_area_defn(area[0])
+        elif type(area[0]).__name__ == 'int':
+          # only the area defn has been supplied
+          ax,ay,aw,ah = self.get_area_defn(area)
+        else:
+          ax,ay,aw,ah = self.get_area_defn(area[0])
+      except:
+        # ignore bad entries
+        continue
+      labels[max(ay,0):max(ay+ah,0), max(ax,0):max(ax+aw,0)] = index
+    return labels
+
+
+  def get_base_area_mask(self) -> np.ndarray:
+    ''' return a (height,width) boolean array marking the cells that lie in a base area '''
+    return self.base_area_labels >= 0
+
+
   def get_area_defn( self, area):
     ''' extract the area properties from the supplied area tuple '''
     x,y,*args = area
@@ -12,6 +12,11 @@ class GridInfo():
   def __init__(self, gridbase: GridBase, **kwargs: dict):
     self.grid = gridbase
 
+    # the direction bitfield of every grid cell, calculated when first required
+    # and recalculated whenever the walls or areas of the grid change
+    self.directions = None
+    self.layout_version = None
+
   def get_cell_directions(self, x: int, y: int, direction: Direction = None) -> list:
     ''' return the list of available directions for the specified position in the grid
         returns a list in the form: {'N':True,'E':False,'S':False,'W':True}
@@ -24,26 +29,16 @@ class GridInfo():
       return {}
 
     # no actions exist off the grid
-    for area in grid.base_areas:
-      # test if only the area defn has been supplied
-      if type(area[0]).__name__ == 'int':
-        ax,ay,aw,ah = grid.get_area_defn(area)
-      else:
-        ax,ay,aw,ah = grid.get_area_defn(area[0])
-      if grid.in_area(x,y,ax,ay,aw,ah):
-        return {}
+    if grid.test_for_base_area(x,y):
+      return {}
 
     # test if the level contains a maze
     if grid.maze is not None:
-      cell = grid.maze.cell_at( x, y )
-
       # if a wall is present then that direction is not possible as an action
-      # - unless the wall properties define a probability of passing      
+      # - unless the wall properties define a probability of passing
       actions = {}
-      for k, v in cell.walls.items():    
-          if 'prob' in cell.properties[k]:
-              v = False
-          actions[k] = not v      
+      for k in ['N','S','E','W']:
+          actions[k] = (not grid.maze.has_wall( x, y, k )) or ('prob' in grid.maze.get_wall_properties( x, y, k ))
     else:
       # initially start with all actions being possible
       actions = {'N':True,'E':True,'S':True,'W':True}
@@ -55,17 +50,10 @@ class GridInfo():
       if y == grid.height-1: del actions['S']
 
     # remove actions that would move to an off-grid cell
-    for area in grid.base_areas:
-      # test if only the area defn has been supplied
-      if type(area[0]).__name__ == 'int':
-        ax,ay,aw,ah = grid.get_area_defn(area)
-      else:
-        ax,ay,aw,ah = grid.get_area_defn(area[0])
-
-      if grid.in_area(x+1,y,ax,ay,aw,ah): del actions['E']
-      if grid.in_area(x-1,y,ax,ay,aw,ah): del actions['W']
-      if grid.in_area(x,y-1,ax,ay,aw,ah): del actions['N']
-      if grid.in_area(x,y+1,ax,ay,aw,ah): del actions['S']
+    if grid.test_for_base_area(x+1,y): actions.pop('E',None)
+    if grid.test_for_base_area(x-1,y): actions.pop('W',None)
+    if grid.test_for_base_area(x,y-1): actions.pop('N',None)
+    if grid.test_for_base_area(x,y+1): actions.pop('S',None)
 
 
     if direction is not None:
@@ -91,15 +79,59 @@ class GridInfo():
 
   def get_direction_value( self, x: int, y: int ) -> Direction:
     ''' return the bitfield value representing the possible directions for the specified grid cell '''
-    return Direction.get_value( self.get_cell_directions( x, y ) )
+    return int(self.get_cached_direction_array()[y,x])
 
 
   def get_direction_array(self) -> np.ndarray:
-    ''' return a numpy array containing the direction value for all grid cells '''
-    height = self.grid.height
-    width = self.grid.width
-    direction_arr = np.zeros((height,width)).astype(int)
-    for y in range(height):
-      for x in range(width):
-        direction_arr[y][x] = self.get_direction_value(x,y)
-    return direction_arr
\ No newline at end of file
+    ''' return a numpy array containing the direction value for all grid cells
+        - this is a new, writable, integer array that the caller is free to modify
+    '''
+    return np.array(self.get_cached_direction_array(),dtype=int)
+
+
+  def get_cached_direction_array(self) -> np.ndarray:
+    ''' return the cached direction values of all grid cells, as a read-only, uint8, numpy array
+        - this is shared by all users of the level, so avoids copying the array for internal
+          calculations that only read the directions
+    '''
+    if (self.directions is None) or (self.layout_version != self.grid.layout_version):
+      self.directions = self.calculate_direction_array()
+      self.directions.flags.writeable = False
+      self.layout_version = self.grid.layout_version
+    return self.directions
+
+
+  def calculate_direction_array(self) -> np.ndarray:
+    ''' calculate the direction bitfield for all grid cells
+        - this gives the same values as 'get_cell_directions' for each cell
+    '''
+    grid = self.grid
+    height = grid.height
+    width = grid.width
+    direction_arr = np.zeros((height,width),dtype=np.uint8)
+
+    if grid.maze is not None:
+      # if a wall is present then that direction is not possible as an action
+      # - unless the wall properties define a probability of passing
+      # (the maze's wall bitmask uses the same bit values as the direction bitfield)
+      direction_arr[:] = grid.maze.get_passable_walls()
+    else:
+      # initially start with all actions being possible
+      # and remove actions that would move off the edges of the grid
+      direction_arr[:] = Direction.All
+      direction_arr[:,0] &= ~np.uint8(Direction.West)
+      direction_arr[:,-1] &= ~np.uint8(Direction.East)
+      direction_arr[0,:] &= ~np.uint8(Direction.North)
+      direction_arr[-1,:] &= ~np.uint8(Direction.South)
+
+    # remove actions that would move to an off-grid cell
+    base_area = grid.get_base_area_mask()
+    direction_arr[:,:-1][base_area[:,1:]] &= ~np.uint8(Direction.East)
+    direction_arr[:,1:][base_area[:,:-1]] &= ~np.uint8(Direction.West)
+    direction_arr[1:,:][base_area[:-1,:]] &= ~np.uint8(Direction.North)
+    direction_arr[:-1,:][base_area[1:,:]] &= ~np.uint8(Direction.South)
+
+    # no actions exist off the grid or in the terminal state
+    direction_arr[base_area] = 0
+    direction_arr[grid.end[1],grid.end[0]] = 0
+    return direction_arr
@@ -6,6 +6,7 @@ from .direction import Direction
 from .grid_base import GridBase
 from .grid_info import GridInfo
 from .actions import Actions
+from .transition_model import TransitionModel
 
 
 class GridLevel():
@@ -23,6 +24,14 @@ class GridLevel():
     self.grid_base = GridBase( dir_path, **kwargs )
     self.grid_info = GridInfo( self.grid_base, **kwargs )
 
+    # the random number generator used to sample the outcome of actions
+    self.np_random = np.random.default_rng( kwargs.get('seed',None) )
+
+    # the compiled transition model is created when first required
+    # and recreated if the walls or areas of the grid change
+    self.transition_model = None
+    self.transition_model_version = None
+
   '''
       Query Functions
   '''
@@ -52,6 +61,13 @@ class GridLevel():
     return self.grid_info.get_directions( x, y )
 
 
+  def get_cached_directions( self ) -> np.ndarray:
+    ''' return the possible directions for all grid cells as a shared, read-only, uint8 array
+        - use 'get_directions' to get an array that can be modified
+    '''
+    return self.grid_info.get_cached_direction_array()
+
+
   def get_rewards( self, x: int = None, y: int = None ) -> Union[Direction,np.ndarray]:
     ''' return the reward for the specified grid cell
         - if a grid cell is not specified then return an array of rewards for all grid cells
@@ -59,155 +75,63 @@ class GridLevel():
     return self.grid_base.get_reward( x, y )
 
 
-  def get_action_probabilities( self, x, y, action: Actions ):
+  def get_transition_model( self ) -> TransitionModel:
+    ''' return the compiled transition model of the level
+        - this is built the first time it's requested and then reused until
+          the walls or areas of the grid change
+    '''
+    if (self.transition_model is None) or (self.transition_model_version != self.grid_base.layout_version):
+      self.transition_model = self.compile_transition_model()
+      self.transition_model_version = self.grid_base.layout_version
+    return self.transition_model
+
+
+  def compile_transition_model( self ) -> TransitionModel:
+    ''' build the transition probability, next state and reward tables for every (state, action) '''
+    directions = self.grid_info.get_cached_direction_array()
+    cell_rewards = self.grid_base.get_reward()
+    probabilities, barriers = self.grid_base.get_transition_probabilities()
+    return TransitionModel( directions, cell_rewards, probabilities, barriers )
+
 
+  def get_action_probabilities( self, x, y, action: Actions ):
+    ''' for an action in a state, return the list of possible next states and rewards
+        and the accompanying probability for each = p(s',r|s,a)
+    '''
     direction = Direction.from_action( action )
     assert direction >= Direction.Stay and direction <= Direction.West
 
-    # check that some actions are possible in this state
-    possible_directions = self.grid_info.get_cell_directions(x,y,direction)
-
-    if not possible_directions or direction==Direction.Stay:
-      # stay in same position, reward is the same as if trying to move into this state
-      # - target only reached if choosing to stay in same state
-      reward = self.grid_base.get_reward( x, y )
-      return [[1.0,[x,y],reward]]
-
-    # get the probability of moving to the intended target
-    transition_probability, barrier = self.grid_base.get_transition_probability( x, y, direction )
-
-    action_list = []
-
-    # find the details of where we end up if action succeeds
-    if transition_probability > 0.0:
-      next_pos = self.get_next_state_position( x, y, direction )
-      reward = self.grid_base.get_reward( next_pos[0], next_pos[1] )
-      action_list.append([transition_probability,next_pos,reward])
-
-    # if the transition probability is 1 then definitely reach target
-    if transition_probability == 1.0:
-      return action_list
-
-    #
-    # transition_probability < 1.0
-    # - more than one next_state for current action
-    #
-
-    # get the list of all other possible states
-    all_actions = self.grid_info.get_cell_directions(x,y)
-    all_actions.pop(direction.get_direction_char(), None)
-    other_directions = [key for (key, value) in all_actions.items() if value]
-
-    # if there are no other states to go to, stay in the current state
-    if len(other_directions) == 0:
-      reward = self.grid_base.get_reward( x, y )
-      action_list.append([(1.0 - transition_probability),[x,y],reward])
-      return action_list
-
-    if barrier:
-      # an extra penalty of -1 is given for running into a wall
-      reward = -1
-
-      # if a barrier existed in the target direction then Baby Robot will end up taking
-      # the opposite action if this exists (i.e. he bounces off the barrier)
-      # - this happens with probability (1-transition_probability)
-      direction = Direction.get_opposite(direction).get_direction_char()
-
-      # check that the opposite direction is possible
-      if direction not in other_directions:
-        # opposite direction not possible - stay in current state
-        reward += self.grid_base.get_reward( x, y )
-        action_list.append([(1.0 - transition_probability),next_pos,reward])
-        return action_list
-
-      next_pos = self.get_next_state_position( x, y, direction )
-      reward += self.grid_base.get_reward( next_pos[0], next_pos[1] )
-      action_list.append([(1.0 - transition_probability),next_pos,reward])
-      return action_list
-
-    # divide the remaining probability over the other possible directions
-    probability = (1.0-transition_probability)/len(other_directions)
-    for other_direction in other_directions:
-      # calculate the postion of the next state
-      next_pos = self.get_next_state_position( x, y, other_direction )
-      reward = self.grid_base.get_reward( next_pos[0], next_pos[1] )
-      action_list.append([probability,next_pos,reward])
+    return self.get_transition_model().get_outcomes( x, y, Actions(action) )
 
-    return action_list
 
-
-  def get_next_state( self, x, y, direction ):
+  def get_next_state( self, x, y, direction, u = None ):
     ''' return the next state and reward for moving
         - (x,y) = current state
         - direction = direction moved from current state
+        - u = uniform random number in [0,1) used to choose the outcome
+          (if not supplied this is drawn from the level's random number generator)
     '''
 
     assert direction >= Direction.Stay and direction <= Direction.West
 
-    # check that some actions are possible in this state
-    possible_actions = self.grid_info.get_cell_directions(x,y,direction)
-    if not possible_actions or direction==Direction.Stay:
-      # stay in same position, reward is the same as if trying to move into this state
-      # - target only reached if choosing to stay in same state
-      reward = self.grid_base.get_reward( x, y )
-      return [x,y],reward,(direction==Direction.Stay)
-
     # a deterministic policy should only have one possible action
-    chosen_action = [key for (key, value) in possible_actions.items() if value]
-    if len(chosen_action) != 1:
-      # stay in same position, reward is the same as if trying to move into this state
-      reward = self.grid_base.get_reward( x, y )
-      return [x,y],reward,False
-
-    # get the list of all other possible states
-    all_actions = self.grid_info.get_cell_directions(x,y)
-    all_actions.pop(chosen_action[0], None)
-    other_states = [key for (key, value) in all_actions.items() if value]
-
-    # get the probability of moving to the intended target
-    transition_probability, barrier = self.grid_base.get_transition_probability( x, y, chosen_action[0] )
-
-    # if the probability is less than the transition probability then move to the target
-    # of if the target state is the only allowed state
-    target_state_reached = True
-    # if (np.random.random() < transition_probability) or (len(other_states) == 0):
-    if (np.random.random() < transition_probability):
-      direction = chosen_action[0]
-    else:
-      # the action did not succeed
-
-      # set the flag to indicate the target state wasn't reached
-      target_state_reached = False
-
-      # if there are no other states to go to, stay in the current state
-      if len(other_states) == 0:
-        direction = Direction.Stay
-      else:
-        if barrier:
-          # if a barrier existed in the target direction then Baby Robot will end up taking
-          # the opposite action if this exists (i.e. he bounces off the barrier)
-          direction = Direction.get_opposite(chosen_action[0])
-
-          # check that the opposite direction is possible
-          if direction not in other_states:
-            return [x,y],-1,False
-
-        else:
-          # choose one of the other possible states
-          direction = np.random.choice(other_states)
-
-    # calculate the postion of the next state
-    next_pos = self.get_next_state_position( x, y, direction )
-
-    # get the reward for taking this action
-    reward = self.grid_base.get_reward( next_pos[0], next_pos[1] )
-
-    # if we bounced off a barrier incur an extra time penalty of -1
-    if barrier:
-      reward += -1
-
-    # for equal probability of taking an action its just the mean of all actions
-    return next_pos, reward, target_state_reached
+    # - stay in same position, reward is the same as if trying to move into this state
+    if direction & (direction-1):
+      return [x,y],self.grid_base.get_reward( x, y ),False
+
+    # sample the outcome of the action from the precomputed cumulative probabilities
+    model = self.get_transition_model()
+    state = model.get_state( x, y )
+    action = Direction.to_action( direction )
+    if u is None:
+      u = self.np_random.random()
+    outcome = model.sample( state, action, u )
+
+    # the target state is only reached if the outcome is the chosen action
+    # (or if choosing to stay in the same state)
+    next_pos = model.get_position( model.next_states[state,outcome] )
+    reward = model.rewards[state,action,outcome].item()
+    return next_pos, reward, (outcome == action)
 
 
   def get_next_state_position( self, x, y, direction ):
@@ -3,76 +3,135 @@
 # Christian Hill, April 2017.
 
 import random
+import numpy as np
+from collections.abc import MutableMapping
+
+
+class CellWalls(MutableMapping):
+    """A dict-like view of the walls of a cell, e.g. {'N': True, 'S': False, ...}.
+    The walls are held in the wall bitmask of the maze, so setting a value
+    changes the maze.
+    """
+
+    def __init__(self, maze, x, y):
+        self.maze, self.x, self.y = maze, x, y
+
+    def __getitem__(self, wall):
+        return self.maze.has_wall(self.x, self.y, wall)
+
+    def __setitem__(self, wall, value):
+        self.maze.set_wall_bit(self.x, self.y, wall, value)
+
+    def __delitem__(self, wall):
+        raise TypeError("walls can't be deleted from a cell")
+
+    def __iter__(self):
+        return iter(Cell.wall_pairs)
+
+    def __len__(self):
+        return len(Cell.wall_pairs)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class CellProperties(MutableMapping):
+    """A dict-like view of the properties of each wall of a cell, e.g. {'N': {'prob': 0.5}, 'S': {}, ...}.
+    Only walls that have properties are held in the side table of the maze, so
+    the empty dictionary returned for any other wall isn't stored.
+    """
+
+    def __init__(self, maze, x, y):
+        self.maze, self.x, self.y = maze, x, y
+
+    def __getitem__(self, wall):
+        return self.maze.get_wall_properties(self.x, self.y, wall)
+
+    def __setitem__(self, wall, properties):
+        self.maze.set_wall_properties(self.x, self.y, wall, properties)
+
+    def __delitem__(self, wall):
+        raise TypeError("walls can't be deleted from a cell")
+
+    def __iter__(self):
+        return iter(Cell.wall_pairs)
+
+    def __len__(self):
+        return len(Cell.wall_pairs)
+
+    def __repr__(self):
+        return repr(dict(self))
+
 
 class Cell:
     """A cell in the maze.
     A maze "Cell" is a point in the grid which may be surrounded by walls to
     the north, east, south or west.
+
+    This is a view of the cell at (x,y) of a maze, whose walls and wall
+    properties are held in the maze's arrays.
     """
 
     # A wall separates a pair of cells in the N-S or W-E directions.
     wall_pairs = {'N': 'S', 'S': 'N', 'E': 'W', 'W': 'E'}
 
-    def __init__(self, x, y, no_walls = False):
-        """Initialize the cell at (x,y). At first it is surrounded by walls."""
+    def __init__(self, maze, x, y):
+        """Create a view of the cell at (x,y) of the maze."""
 
+        self.maze = maze
         self.x, self.y = x, y
 
-        if no_walls:
-          self.walls = {'N': False, 'S': False, 'E': False, 'W': False }
-        else:
-          self.walls = {'N': True, 'S': True, 'E': True, 'W': True}
+    @property
+    def walls(self):
+        return CellWalls(self.maze, self.x, self.y)
 
-        self.properties = {'N': {}, 'S': {}, 'E': {}, 'W': {} }
+    @property
+    def properties(self):
+        return CellProperties(self.maze, self.x, self.y)
 
     def has_all_walls(self):
         """Does this cell still have all its walls?"""
-
-        # check if all items in the list are true
-        return all(self.walls.values())
+        return self.maze.walls[self.y, self.x] == Maze.all_walls
 
     def knock_down_wall(self, other, wall):
         """Knock down the wall between cells self and other."""
-
-        self.walls[wall] = False
-        other.walls[Cell.wall_pairs[wall]] = False
-
-        self.properties[wall] = {}
-        other.properties[Cell.wall_pairs[wall]] = {}
+        self.maze.knock_down_wall(self.x, self.y, wall)
 
     def add_wall(self, other, wall, properties):
         """Add a wall between cells self and other."""
-
-        self.walls[wall] = True
-        other.walls[Cell.wall_pairs[wall]] = True
-
-        self.properties[wall] = properties
-        other.properties[Cell.wall_pairs[wall]] = properties
+        self.maze.add_wall(self.x, self.y, wall, properties)
 
     def toggle_wall(self, other, wall, properties):
-        if self.walls[wall]:
-          self.knock_down_wall(other,wall)
-        else:
-          self.add_wall(other,wall,properties)
+        self.maze.toggle_wall(self.x, self.y, wall, properties)
 
     def get_probability(self, direction):
-        ''' get the probability of being able to move in the supplied direction from this cell 
+        ''' get the probability of being able to move in the supplied direction from this cell
             due to any walls or probabilistic walls defined for the cell
 
             returns:
             - the probability of moving from the current cell in the specified direction
             - 'True' if a probabilistic barrier exists in the chosen direction, "False" otherwise
         '''
-        if 'prob' in self.properties[direction]:
-           return self.properties[direction]['prob'], True
-        # if a wall exists there's zero probability of moving in that direction
-        # - otherwise there's 100% chance of moving in that direction wrt walls 
-        # (other properties of the cell may change this)
-        return 0 if self.walls[direction] else 1, False
+        return self.maze.get_probability(self.x, self.y, direction)
 
 
 class Maze:
-    """A Maze, represented as a grid of cells."""
+    """A Maze, represented as a grid of cells.
+
+    The walls of every cell are held in a (ny,nx) uint8 bitmask, using the same
+    bit values as the 'Direction' bitfield (N=1, E=2, S=4, W=8). Any properties
+    of a wall, such as 'prob', 'color', 'width' or 'fit', are held in a sparse
+    side table, keyed by the (x,y) position of the cell and the wall.
+    """
+
+    wall_bits = {'N': 1, 'E': 2, 'S': 4, 'W': 8}
+    all_walls = 15
+
+    # the offset to the neighbouring cell on the other side of each wall
+    wall_offsets = {'N': (0, -1), 'E': (1, 0), 'S': (0, 1), 'W': (-1, 0)}
+
+    # the number of random values drawn at a time by the maze generators
+    random_block_size = 4096
 
     def __init__(self, nx, ny, ix=0, iy=0, seed = None, no_walls = False):
         """Initialize the maze grid.
@@ -80,33 +139,129 @@ class Maze:
         at the cell indexed at (ix, iy).
         """
 
-        # set the seed for random if want to produce consistent maze
-        if seed is not None: random.seed(seed)
+        # the maze's own random number generators, seeded to produce a consistent maze
+        # - the backtracker uses 'random', to give the same mazes as previous versions
+        self.random = random.Random(seed)
+        self.np_random = np.random.default_rng(seed)
 
         self.nx, self.ny = nx, ny
         self.ix, self.iy = ix, iy
-        self.maze_map = [[Cell(x, y, no_walls) for y in range(ny)] for x in range(nx)]
+        self.walls = np.full((ny, nx), 0 if no_walls else Maze.all_walls, dtype=np.uint8)
+        self.wall_properties = {}
 
         if no_walls:
           self.add_boundary_walls()
 
     def add_boundary_walls(self):
         """ add walls around the outside of the level """
-        for y in range(self.ny):
-          for x in range(self.nx):
-            if y == 0:
-              self.cell_at(x, y).walls['N'] = True
-            elif (y+1) == self.ny:
-              self.cell_at(x, y).walls['S'] = True
-
-            if x == 0:
-              self.cell_at(x, y).walls['W'] = True
-            elif (x+1) == self.nx:
-              self.cell_at(x, y).walls['E'] = True
+        self.walls[0, :] |= Maze.wall_bits['N']
+        self.walls[-1, :] |= Maze.wall_bits['S']
+        self.walls[:, 0] |= Maze.wall_bits['W']
+        self.walls[:, -1] |= Maze.wall_bits['E']
 
     def cell_at(self, x, y):
-        """Return the Cell object at (x,y)."""
-        return self.maze_map[x][y]
+        """Return a view of the Cell at (x,y)."""
+        return Cell(self, x, y)
+
+    def get_neighbour(self, x, y, wall):
+        """Return the position of the cell on the other side of a wall, or None if it's off the grid."""
+        dx, dy = Maze.wall_offsets[wall]
+        x2, y2 = x + dx, y + dy
+        if (0 <= x2 < self.nx) and (0 <= y2 < self.ny):
+            return x2, y2
+        return None
+
+    def has_wall(self, x, y, wall):
+        """Is there a wall on the specified side of the cell at (x,y)?"""
+        return bool(self.walls[y, x] & Maze.wall_bits[wall])
+
+    def set_wall_bit(self, x, y, wall, value):
+        """Set or clear a single wall of the cell at (x,y), without changing its neighbour."""
+        if value:
+            self.walls[y, x] |= Maze.wall_bits[wall]
+        else:
+            self.walls[y, x] &= ~np.uint8(Maze.wall_bits[wall])
+
+    def get_wall_properties(self, x, y, wall):
+        """Return the properties of a wall of the cell at (x,y), or an empty dictionary if it has none."""
+        return self.wall_properties.get((x, y, wall), {})
+
+    def set_wall_properties(self, x, y, wall, properties):
+        """Set the properties of a wall of the cell at (x,y), without changing its neighbour."""
+        if properties:
+            self.wall_properties[(x, y, wall)] = properties
+        else:
+            self.wall_properties.pop((x, y, wall), None)
+
+    def set_wall(self, x, y, wall, value, properties = None):
+        """Add or remove the wall on the specified side of the cell at (x,y) and
+        the matching wall of the cell on the other side, if there is one.
+        """
+        self.set_wall_bit(x, y, wall, value)
+        self.set_wall_properties(x, y, wall, properties)
+
+        neighbour = self.get_neighbour(x, y, wall)
+        if neighbour is not None:
+            x2, y2 = neighbour
+            self.set_wall_bit(x2, y2, Cell.wall_pairs[wall], value)
+            self.set_wall_properties(x2, y2, Cell.wall_pairs[wall], properties)
+
+    def knock_down_wall(self, x, y, wall):
+        """Knock down the wall between the cell at (x,y) and its neighbour."""
+        self.set_wall(x, y, wall, False)
+
+    def add_wall(self, x, y, wall, properties):
+        """Add a wall between the cell at (x,y) and its neighbour."""
+        self.set_wall(x, y, wall, True, properties)
+
+    def toggle_wall(self, x, y, wall, properties):
+        """Remove the wall between the cell at (x,y) and its neighbour if it exists, otherwise add it."""
+        if self.has_wall(x, y, wall):
+            self.knock_down_wall(x, y, wall)
+        else:
+            self.add_wall(x, y, wall, properties)
+
+    def get_probability(self, x, y, wall):
+        ''' get the probability of being able to move through the specified wall of the cell at (x,y)
+
+            returns:
+            - the probability of moving from the cell in the specified direction
+            - 'True' if a probabilistic barrier exists in the chosen direction, "False" otherwise
+        '''
+        properties = self.wall_properties.get((x, y, wall), {})
+        if 'prob' in properties:
+           return properties['prob'], True
+        # if a wall exists there's zero probability of moving in that direction
+        # - otherwise there's 100% chance of moving in that direction wrt walls
+        # (other properties of the cell may change this)
+        return 0 if self.has_wall(x, y, wall) else 1, False
+
+    def get_probabilities(self):
+        ''' get the probability of being able to move through each side of every cell
+
+            returns:
+            - a (ny,nx,4) array of the probability of moving out of each cell, in the order N,E,S,W
+            - a (ny,nx,4) boolean array that's 'True' where a probabilistic barrier exists
+        '''
+        sides = list(Maze.wall_bits)
+        bits = np.array(list(Maze.wall_bits.values()), dtype=np.uint8)
+        probabilities = ((self.walls[:, :, None] & bits) == 0).astype(float)
+        barriers = np.zeros(probabilities.shape, dtype=bool)
+        for (x, y, wall), properties in self.wall_properties.items():
+            if 'prob' in properties:
+                probabilities[y, x, sides.index(wall)] = properties['prob']
+                barriers[y, x, sides.index(wall)] = True
+        return probabilities, barriers
+
+    def get_passable_walls(self):
+        ''' return a (ny,nx) uint8 bitmask of the sides of each cell that can be moved through
+            - these are the sides with no wall, or with a wall that has a probability of passing
+        '''
+        passable = ~self.walls & np.uint8(Maze.all_walls)
+        for (x, y, wall), properties in self.wall_properties.items():
+            if 'prob' in properties:
+                passable[y, x] |= Maze.wall_bits[wall]
+        return passable
 
     def dimensions(self):
         return self.nx, self.ny
@@ -118,20 +273,28 @@ class Maze:
         for y in range(self.ny):
             maze_row = ['|']
             for x in range(self.nx):
-                if self.maze_map[x][y].walls['E']:
+                if self.has_wall(x, y, 'E'):
                     maze_row.append(' |')
                 else:
                     maze_row.append('  ')
             maze_rows.append(''.join(maze_row))
             maze_row = ['|']
             for x in range(self.nx):
-                if self.maze_map[x][y].walls['S']:
+                if self.has_wall(x, y, 'S'):
                     maze_row.append('-+')
                 else:
                     maze_row.append(' +')
             maze_rows.append(''.join(maze_row))
         return '\n'.join(maze_rows)
 
+    def get_south_east_walls(self):
+        """Return the (x,y) positions of the cells that have a South or East wall,
+        ordered by column and then by row.
+        """
+        has_wall = (self.walls & (Maze.wall_bits['S'] | Maze.wall_bits['E'])) != 0
+        xs, ys = np.nonzero(has_wall.T)
+        return zip(xs.tolist(), ys.tolist())
+
     def write_svg(self, filename):
         """Write an SVG image of the maze to filename."""
 
@@ -168,14 +331,13 @@ class Maze:
             # Draw the "South" and "East" walls of each cell, if present (these
             # are the "North" and "West" walls of a neighbouring cell in
             # general, of course).
-            for x in range(self.nx):
-                for y in range(self.ny):
-                    if self.cell_at(x, y).walls['S']:
-                        x1, y1, x2, y2 = x * scx, (y + 1) * scy, (x + 1) * scx, (y + 1) * scy
-                        write_wall(f, x1, y1, x2, y2)
-                    if self.cell_at(x, y).walls['E']:
-                        x1, y1, x2, y2 = (x + 1) * scx, y * scy, (x + 1) * scx, (y + 1) * scy
-                        write_wall(f, x1, y1, x2, y2)
+            for x, y in self.get_south_east_walls():
+                if self.has_wall(x, y, 'S'):
+                    x1, y1, x2, y2 = x * scx, (y + 1) * scy, (x + 1) * scx, (y + 1) * scy
+                    write_wall(f, x1, y1, x2, y2)
+                if self.has_wall(x, y, 'E'):
+                    x1, y1, x2, y2 = (x + 1) * scx, y * scy, (x + 1) * scx, (y + 1) * scy
+                    write_wall(f, x1, y1, x2, y2)
             # Draw the North and West maze border, which won't have been drawn
             # by the procedure above.
             print('<line x1="0" y1="0" x2="{}" y2="0"/>'.format(width), file=f)
@@ -193,34 +355,253 @@ class Maze:
         for direction, (dx, dy) in delta:
             x2, y2 = cell.x + dx, cell.y + dy
             if (0 <= x2 < self.nx) and (0 <= y2 < self.ny):
-                neighbour = self.cell_at(x2, y2)
-                if neighbour.has_all_walls():
-                    neighbours.append((direction, neighbour))
+                if self.walls[y2, x2] == Maze.all_walls:
+                    neighbours.append((direction, self.cell_at(x2, y2)))
         return neighbours
 
-    def make_maze(self):
+    def make_maze(self, algorithm = 'backtracker'):
+        """Knock down walls to create a maze, using one of the following algorithms:
+
+        - 'backtracker': a depth-first search with backtracking, giving long, winding
+          corridors. This is the original algorithm and gives the same maze as before
+          for a given seed.
+        - 'kruskal': randomized Kruskal, which joins cells across the walls in a random
+          order. The walls are processed as whole arrays, making this the quickest
+          algorithm for very large mazes.
+        - 'wilson': loop-erased random walks, giving a maze picked uniformly from all
+          the possible mazes.
+        - 'prim': randomized Prim, which grows the maze from the start cell, giving
+          many short dead ends.
+
+        All of the algorithms work iteratively, so there's no limit on the size of the
+        maze, and use the maze's own random number generators, so the same seed always
+        gives the same maze.
+        """
+        generators = {'backtracker': self.make_backtracker_maze,
+                      'kruskal': self.make_kruskal_maze,
+                      'wilson': self.make_wilson_maze,
+                      'prim': self.make_prim_maze}
+        if algorithm not in generators:
+            raise Exception(f"unknown maze algorithm '{algorithm}', must be one of {list(generators)}")
+        generators[algorithm]()
+
+    def make_backtracker_maze(self):
+        # The walls are knocked down in a flat list, which is quicker to index
+        # than the wall bitmask, and copied back once the maze is complete.
+        nx = self.nx
+        walls = self.walls.reshape(-1).tolist()
+        bits = Maze.wall_bits
+        delta = [('W', -1, 0), ('E', 1, 0), ('S', 0, 1), ('N', 0, -1)]
+
         # Total number of cells.
         n = self.nx * self.ny
         cell_stack = []
-        current_cell = self.cell_at(self.ix, self.iy)
+        x, y = self.ix, self.iy
         # Total number of visited cells during maze construction.
         nv = 1
 
         while nv < n:
-            neighbours = self.find_valid_neighbours(current_cell)
+            # Find the unvisited neighbours of the current cell.
+            neighbours = []
+            for direction, dx, dy in delta:
+                x2, y2 = x + dx, y + dy
+                if (0 <= x2 < self.nx) and (0 <= y2 < self.ny) and walls[y2 * nx + x2] == Maze.all_walls:
+                    neighbours.append((direction, x2, y2))
 
             if not neighbours:
                 # We've reached a dead end: backtrack.
-                current_cell = cell_stack.pop()
+                x, y = cell_stack.pop()
                 continue
 
             # Choose a random neighbouring cell and move to it.
-            direction, next_cell = random.choice(neighbours)
-            current_cell.knock_down_wall(next_cell, direction)
-            cell_stack.append(current_cell)
-            current_cell = next_cell
+            direction, x2, y2 = self.random.choice(neighbours)
+            walls[y * nx + x] &= ~bits[direction]
+            walls[y2 * nx + x2] &= ~bits[Cell.wall_pairs[direction]]
+            cell_stack.append((x, y))
+            x, y = x2, y2
             nv += 1
 
+        self.walls[:] = np.array(walls, dtype=np.uint8).reshape(self.walls.shape)
+
+    def make_kruskal_maze(self):
+        # Randomized Kruskal joins the cells on either side of each wall, taking the
+        # walls in a random order and skipping any that would join cells that are
+        # already connected. This gives the minimum spanning tree of the grid when
+        # each wall is weighted by its position in the random order, so the same tree
+        # is found here using Boruvka's algorithm: on each pass every group of
+        # connected cells is joined through its lowest weighted wall, which can be
+        # done for all groups at once. The number of groups at least halves on each pass.
+        nx, ny = self.nx, self.ny
+        n = nx * ny
+        cells = np.arange(n, dtype=np.int32).reshape(ny, nx)
+
+        # the cells on either side of each horizontal and then each vertical wall
+        first = np.concatenate((cells[:, :-1].ravel(), cells[:-1, :].ravel()))
+        second = np.concatenate((cells[:, 1:].ravel(), cells[1:, :].ravel()))
+        num_walls = len(first)
+        num_horizontal = ny * (nx - 1)
+
+        # the random order of the walls and the weight (position in the order) of each wall
+        wall_order = self.np_random.permutation(num_walls).astype(np.int32)
+        weights = np.empty(num_walls, dtype=np.int32)
+        weights[wall_order] = np.arange(num_walls, dtype=np.int32)
+
+        group = np.arange(n, dtype=np.int32)
+        parent = np.arange(n, dtype=np.int32)
+        removed = np.zeros(num_walls, dtype=bool)
+
+        # the weights of the walls that could still be removed and the groups on either side of them
+        remaining = weights
+        group_1, group_2 = first, second
+        while len(remaining) > 0:
+
+            # find the lowest weighted wall of each group and remove it
+            lowest = np.full(n, num_walls, dtype=np.int32)
+            np.minimum.at(lowest, group_1, remaining)
+            np.minimum.at(lowest, group_2, remaining)
+            joined = np.flatnonzero(lowest < num_walls).astype(np.int32)
+            chosen = wall_order[lowest[joined]]
+            removed[chosen] = True
+
+            # link each group to the group on the other side of its chosen wall
+            # - where two groups chose the same wall only the higher numbered group is linked
+            group_a, group_b = group[first[chosen]], group[second[chosen]]
+            other = np.where(group_a == joined, group_b, group_a)
+            parent[joined] = other
+            mutual = (parent[other] == joined) & (joined < other)
+            parent[joined[mutual]] = joined[mutual]
+
+            # follow the links to find the new group of every group that was joined
+            linked = joined[parent[joined] != joined]
+            while len(linked) > 0:
+                grandparent = parent[parent[linked]]
+                moved = (grandparent != parent[linked])
+                parent[linked] = grandparent
+                linked = linked[moved]
+            group = parent[group]
+
+            # only walls between different groups can still be removed
+            group_1, group_2 = parent[group_1], parent[group_2]
+            between = (group_1 != group_2)
+            remaining, group_1, group_2 = remaining[between], group_1[between], group_2[between]
+
+        # knock down the walls on both sides
+        walls = self.walls.reshape(-1)
+        horizontal, vertical = removed[:num_horizontal], removed[num_horizontal:]
+        walls[first[:num_horizontal][horizontal]] &= ~np.uint8(Maze.wall_bits['E'])
+        walls[second[:num_horizontal][horizontal]] &= ~np.uint8(Maze.wall_bits['W'])
+        walls[first[num_horizontal:][vertical]] &= ~np.uint8(Maze.wall_bits['S'])
+        walls[second[num_horizontal:][vertical]] &= ~np.uint8(Maze.wall_bits['N'])
+
+    def make_wilson_maze(self):
+        # Starting with only the start cell in the maze, take a random walk from
+        # each cell that isn't yet in the maze until the walk reaches the maze.
+        # Following the last direction taken from each cell then gives a path with
+        # any loops erased, and this path is added to the maze.
+        nx, ny = self.nx, self.ny
+        walls = self.walls.reshape(-1).tolist()
+        bits, opposite_bits, dx, dy = Maze.get_direction_tables()
+
+        in_maze = bytearray(nx * ny)
+        in_maze[self.iy * nx + self.ix] = 1
+        exit_direction = [0] * (nx * ny)
+        random_directions = []
+        index = 0
+
+        for start in self.np_random.permutation(nx * ny).tolist():
+            if in_maze[start]:
+                continue
+
+            # walk randomly until a cell in the maze is reached
+            y, x = divmod(start, nx)
+            cell = start
+            while not in_maze[cell]:
+                if index == len(random_directions):
+                    random_directions = self.np_random.integers(0, 4, Maze.random_block_size).tolist()
+                    index = 0
+                direction = random_directions[index]
+                index += 1
+                x2, y2 = x + dx[direction], y + dy[direction]
+                if (0 <= x2 < nx) and (0 <= y2 < ny):
+                    exit_direction[cell] = direction
+                    x, y = x2, y2
+                    cell = y * nx + x
+
+            # add the loop-erased path to the maze
+            cell = start
+            while not in_maze[cell]:
+                in_maze[cell] = 1
+                direction = exit_direction[cell]
+                walls[cell] &= ~bits[direction]
+                cell += dy[direction] * nx + dx[direction]
+                walls[cell] &= ~opposite_bits[direction]
+
+        self.walls[:] = np.array(walls, dtype=np.uint8).reshape(self.walls.shape)
+
+    def make_prim_maze(self):
+        # Grow the maze from the start cell. On each step a random cell on the
+        # frontier of the maze is joined to a random neighbour already in the
+        # maze, and its own neighbours are added to the frontier.
+        nx, ny = self.nx, self.ny
+        walls = self.walls.reshape(-1).tolist()
+        bits, opposite_bits, dx, dy = Maze.get_direction_tables()
+
+        in_maze = bytearray(nx * ny)
+        on_frontier = bytearray(nx * ny)
+        frontier = []
+        uniforms = []
+        index = 0
+
+        def add_to_frontier(x, y):
+            for direction in range(4):
+                x2, y2 = x + dx[direction], y + dy[direction]
+                if (0 <= x2 < nx) and (0 <= y2 < ny):
+                    cell = y2 * nx + x2
+                    if not (in_maze[cell] or on_frontier[cell]):
+                        on_frontier[cell] = 1
+                        frontier.append(cell)
+
+        in_maze[self.iy * nx + self.ix] = 1
+        add_to_frontier(self.ix, self.iy)
+
+        while frontier:
+            if index + 2 > len(uniforms):
+                uniforms = self.np_random.random(Maze.random_block_size).tolist()
+                index = 0
+
+            # remove a random cell from the frontier
+            position = int(uniforms[index] * len(frontier))
+            cell = frontier[position]
+            frontier[position] = frontier[-1]
+            frontier.pop()
+
+            # join it to a random neighbour that's already in the maze
+            y, x = divmod(cell, nx)
+            joins = [direction for direction in range(4)
+                     if (0 <= x + dx[direction] < nx) and (0 <= y + dy[direction] < ny)
+                     and in_maze[cell + dy[direction] * nx + dx[direction]]]
+            direction = joins[int(uniforms[index + 1] * len(joins))]
+            index += 2
+            walls[cell] &= ~bits[direction]
+            walls[cell + dy[direction] * nx + dx[direction]] &= ~opposite_bits[direction]
+
+            in_maze[cell] = 1
+            add_to_frontier(x, y)
+
+        self.walls[:] = np.array(walls, dtype=np.uint8).reshape(self.walls.shape)
+
+    @staticmethod
+    def get_direction_tables():
+        """Return lists of the wall bit, the opposite wall bit and the x and y offsets
+        of each direction, in the order N,E,S,W.
+        """
+        sides = list(Maze.wall_bits)
+        bits = [Maze.wall_bits[side] for side in sides]
+        opposite_bits = [Maze.wall_bits[Cell.wall_pairs[side]] for side in sides]
+        dx = [Maze.wall_offsets[side][0] for side in sides]
+        dy = [Maze.wall_offsets[side][1] for side in sides]
+        return bits, opposite_bits, dx, dy
+
     def write_to_canvas(self, canvas, maze_height, maze_padding, color='#000', wall_width=4 ):
         ' draw the maze onto the canvas '
 
@@ -250,42 +631,42 @@ class Maze:
         # Draw the "South" and "East" walls of each cell, if present (these
         # are the "North" and "West" walls of a neighbouring cell in
         # general, of course).
-        for x in range(self.nx):
-            for y in range(self.ny):
-                cell = self.cell_at(x, y)
-                if cell.walls['S']:
-                    x1, y1, x2, y2 = x * scx, (y + 1) * scy, (x + 1) * scx, (y + 1) * scy
-
-                    if 'color' in cell.properties['S']:
-                      canvas.stroke_style = cell.properties['S']['color']
-                    if 'width' in cell.properties['S']:
-                      canvas.line_width = cell.properties['S']['width']
-                    if 'fit' in cell.properties['S']:
-                      # truncate the wall horizontally
-                      x1 += (canvas.line_width//2)
-                      x2 -= (canvas.line_width//2)
-
-                    draw_wall(x1, y1, x2, y2)
-
-                    canvas.stroke_style = color
-                    canvas.line_width = wall_width
-
-                if cell.walls['E']:
-                    x1, y1, x2, y2 = (x + 1) * scx, y * scy, (x + 1) * scx, (y + 1) * scy
-
-                    if 'color' in cell.properties['E']:
-                      canvas.stroke_style = cell.properties['E']['color']
-                    if 'width' in cell.properties['E']:
-                      canvas.line_width = cell.properties['E']['width']
-                    if 'fit' in cell.properties['E']:
-                      # truncate the wall vertically
-                      y1 += (canvas.line_width//2)
-                      y2 -= (canvas.line_width//2)
-
-                    draw_wall(x1, y1, x2, y2)
-
-                    canvas.stroke_style = color
-                    canvas.line_width = wall_width
+        for x, y in self.get_south_east_walls():
+            if self.has_wall(x, y, 'S'):
+                x1, y1, x2, y2 = x * scx, (y + 1) * scy, (x + 1) * scx, (y + 1) * scy
+
+                properties = self.get_wall_properties(x, y, 'S')
+                if 'color' in properties:
+                  canvas.stroke_style = properties['color']
+                if 'width' in properties:
+                  canvas.line_width = properties['width']
+                if 'fit' in properties:
+                  # truncate the wall horizontally
+                  x1 += (canvas.line_width//2)
+                  x2 -= (canvas.line_width//2)
+
+                draw_wall(x1, y1, x2, y2)
+
+                canvas.stroke_style = color
+                canvas.line_width = wall_width
+
+            if self.has_wall(x, y, 'E'):
+                x1, y1, x2, y2 = (x + 1) * scx, y * scy, (x + 1) * scx, (y + 1) * scy
+
+                properties = self.get_wall_properties(x, y, 'E')
+                if 'color' in properties:
+                  canvas.stroke_style = properties['color']
+                if 'width' in properties:
+                  canvas.line_width = properties['width']
+                if 'fit' in properties:
+                  # truncate the wall vertically
+                  y1 += (canvas.line_width//2)
+                  y2 -= (canvas.line_width//2)
+
+                draw_wall(x1, y1, x2, y2)
+
+                canvas.stroke_style = color
+                canvas.line_width = wall_width
 
 
         # Draw the North and West maze border, which won't have been drawn
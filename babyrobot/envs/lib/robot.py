@@ -67,13 +67,11 @@ class Robot():
         if direction == Direction.Stay:
           return False
 
-        cell = None
         if self.maze is not None:
             x, y = self.get_cell_position()
-            cell = self.maze.cell_at( x, y )
-            if direction == Direction.North and cell.walls['N']: return False
-            if direction == Direction.South and cell.walls['S']: return False
-            if direction == Direction.East and cell.walls['E']: return False
-            if direction == Direction.West and cell.walls['W']: return False
+            if direction == Direction.North and self.maze.has_wall( x, y, 'N' ): return False
+            if direction == Direction.South and self.maze.has_wall( x, y, 'S' ): return False
+            if direction == Direction.East and self.maze.has_wall( x, y, 'E' ): return False
+            if direction == Direction.West and self.maze.has_wall( x, y, 'W' ): return False
 
         return True
\ No newline at end of file
@@ -0,0 +1,185 @@
+import numpy as np
+
+from .actions import Actions
+from .direction import Direction
+
+
+''' class holding the compiled dynamics of a grid level '''
+class TransitionModel():
+  '''
+    The transition probabilities, next states and rewards for every (state, action) pair
+    of a grid level, held as NumPy arrays.
+
+    States are the flattened grid positions, s = (y * width) + x.
+
+    Each action moves to a fixed neighbour of the current state, so the possible outcomes
+    of any action are stored in one slot per action (in the order of the 'Actions' enum):
+    - next_states[s,k]     = the state reached when moving in the direction of action 'k'
+                             (the 'Stay' slot, and any blocked direction, lead back to 's')
+    - probabilities[s,a,k] = the probability of ending in next_states[s,k] when taking action 'a'
+    - rewards[s,a,k]       = the reward received for that transition
+    - cumulative[s,a,k]    = the running total of the probabilities, used for sampling
+
+    The target of an action is reached when the outcome slot is the action itself.
+  '''
+
+  # the change in (x,y) for each action
+  action_offsets = np.array([[0,0],[0,-1],[1,0],[0,1],[-1,0]])
+
+  # the direction bit for each action
+  action_directions = np.array([Direction.Stay, Direction.North, Direction.East, Direction.South, Direction.West])
+
+  # the action in the opposite direction to each action
+  opposite_actions = np.array([Actions.Stay, Actions.South, Actions.West, Actions.North, Actions.East])
+
+
+  def __init__( self, directions: np.ndarray, cell_rewards: np.ndarray,
+                transition_probabilities: np.ndarray, barriers: np.ndarray ):
+    '''
+      - directions = (height,width) bitfield of the directions available in each cell
+      - cell_rewards = (height,width) reward for moving into each cell
+      - transition_probabilities = (height,width,5) probability of reaching the target when
+        moving from a cell in the direction of each action
+      - barriers = (height,width,5) flag set where a probabilistic barrier lies in the
+        direction of each action
+    '''
+    self.height, self.width = directions.shape
+    self.num_states = self.height * self.width
+    self.num_actions = len(Actions)
+
+    self.compile( directions, cell_rewards, transition_probabilities, barriers )
+
+
+  def compile( self, directions, cell_rewards, transition_probabilities, barriers ):
+    ''' build the transition tables for every (state, action) pair '''
+
+    num_states = self.num_states
+    num_actions = self.num_actions
+    states = np.arange(num_states)
+
+    # the directions possible for each action in each state
+    # - 'Stay' is never a move to another state
+    directions = directions.reshape(num_states).astype(int)
+    available = (directions[:,None] & self.action_directions[None,:]) > 0
+
+    # the state reached by moving in each direction (or the current state if the move isn't possible)
+    xs = states % self.width
+    ys = states // self.width
+    nx = np.clip(xs[:,None] + self.action_offsets[:,0], 0, self.width-1)
+    ny = np.clip(ys[:,None] + self.action_offsets[:,1], 0, self.height-1)
+    self.next_states = np.where(available, (ny * self.width) + nx, states[:,None])
+
+    # the reward for moving to each of the possible next states
+    cell_rewards = np.asarray(cell_rewards, dtype=float).reshape(num_states)
+    stay_reward = cell_rewards
+    next_reward = cell_rewards[self.next_states]
+
+    transition_probabilities = transition_probabilities.reshape(num_states,num_actions)
+    barriers = barriers.reshape(num_states,num_actions)
+
+    self.probabilities = np.zeros((num_states,num_actions,num_actions))
+    self.rewards = np.zeros((num_states,num_actions,num_actions))
+
+    for action in range(num_actions):
+      probabilities = self.probabilities[:,action,:]
+      rewards = self.rewards[:,action,:]
+
+      # stay in the same position if the action is 'Stay' or it isn't possible in this state
+      # - reward is the same as if trying to move into this state
+      stay = ~available[:,action]
+      probabilities[stay,Actions.Stay] = 1.0
+      rewards[stay,Actions.Stay] = stay_reward[stay]
+
+      if action == Actions.Stay:
+        continue
+
+      # the action reaches its target with the state's transition probability
+      move = available[:,action]
+      target_probability = transition_probabilities[:,action]
+      probabilities[move,action] = target_probability[move]
+      rewards[move,action] = next_reward[move,action]
+
+      # the remaining probability is shared among the other possible outcomes
+      remaining = 1.0 - target_probability
+      others = available.copy()
+      others[:,action] = False
+      num_others = others.sum(axis=1)
+
+      # if there are no other states to go to, stay in the current state
+      no_others = move & (num_others == 0)
+      probabilities[no_others,Actions.Stay] = remaining[no_others]
+      rewards[no_others,Actions.Stay] = stay_reward[no_others]
+
+      # a barrier in the target direction bounces Baby Robot in the opposite direction
+      # - an extra penalty of -1 is given for running into a barrier
+      # - if the opposite direction isn't possible he stays in the current state
+      opposite = self.opposite_actions[action]
+      bounce = move & barriers[:,action] & (num_others > 0)
+      bounce_back = bounce & available[:,opposite]
+      bounce_stay = bounce & ~available[:,opposite]
+      probabilities[bounce_back,opposite] = remaining[bounce_back]
+      rewards[bounce_back,opposite] = next_reward[bounce_back,opposite] - 1
+      probabilities[bounce_stay,Actions.Stay] = remaining[bounce_stay]
+      rewards[bounce_stay,Actions.Stay] = stay_reward[bounce_stay] - 1
+
+      # otherwise divide the remaining probability over the other possible directions
+      slip = move & ~barriers[:,action] & (num_others > 0)
+      slip_probability = np.zeros(num_states)
+      slip_probability[slip] = remaining[slip] / num_others[slip]
+      slip_others = slip[:,None] & others
+      probabilities[slip_others] = np.broadcast_to(slip_probability[:,None],others.shape)[slip_others]
+      rewards[slip_others] = next_reward[slip_others]
+
+    # the cumulative probabilities, normalised so each row ends at exactly 1
+    self.cumulative = np.cumsum(self.probabilities, axis=2)
+    self.cumulative /= self.cumulative[:,:,-1:]
+
+
+  '''
+      Query Functions
+  '''
+
+  def get_state( self, x: int, y: int ) -> int:
+    ''' convert a grid position into a state index '''
+    return (y * self.width) + x
+
+
+  def get_position( self, state: int ) -> list:
+    ''' convert a state index into an [x,y] grid position '''
+    return [int(state % self.width), int(state // self.width)]
+
+
+  def get_expected_rewards( self ) -> np.ndarray:
+    ''' return the expected reward R[s,a] for taking each action in each state '''
+    return np.sum(self.probabilities * self.rewards, axis=2)
+
+
+  def get_dense_probabilities( self ) -> np.ndarray:
+    ''' return the transition probabilities as a dense P[s,a,s'] array
+        - this has (num_states * num_actions * num_states) entries, so is only suitable for small levels
+    '''
+    dense = np.zeros((self.num_states,self.num_actions,self.num_states))
+    states = np.broadcast_to(np.arange(self.num_states)[:,None,None],self.probabilities.shape)
+    actions = np.broadcast_to(np.arange(self.num_actions)[None,:,None],self.probabilities.shape)
+    next_states = np.broadcast_to(self.next_states[:,None,:],self.probabilities.shape)
+    np.add.at(dense,(states,actions,next_states),self.probabilities)
+    return dense
+
+
+  def get_outcomes( self, x: int, y: int, action: Actions ) -> list:
+    ''' for an action in a state, return the list of possible next states and rewards
+        and the accompanying probability for each = p(s',r|s,a)
+        - returns a list of the form [[probability,[x,y],reward],...]
+    '''
+    state = self.get_state(x,y)
+    outcomes = []
+    for k in np.flatnonzero(self.probabilities[state,action]):
+      outcomes.append([self.probabilities[state,action,k].item(),
+                       self.get_position(self.next_states[state,k]),
+                       self.rewards[state,action,k].item()])
+    return outcomes
+
+
+  def sample( self, state: int, action: Actions, u: float ) -> int:
+    ''' select an outcome slot for the action using a uniform random number 'u' in [0,1) '''
+    return int(np.searchsorted(self.cumulative[state,action], u, side='right'))
@@ -3,8 +3,16 @@
 
 from .policy import Policy
 from .deterministic_policy import DeterministicPolicy
+from .tabular_policy import TabularPolicy
+from .backup_solver import BackupSolver
+from .convergence import ConvergenceHistory
 from .policy_evaluation import PolicyEvaluation
 from .value_iteration import ValueIteration
+from .parallel_value_iteration import ParallelValueIteration
+from .policy_iteration import PolicyIteration
+from .parameter_sweep import ParameterSweep
+from .solution_cache import SolutionCache
+from .batch_rollout import BatchRollout
 from .monte_carlo import MonteCarlo, MonteCarloStateValues, MonteCarloActionValues, DeltaType, MonteCarloGPI
 from .utils import Utils
 from .animation import Animate
@@ -404,9 +404,8 @@ class Animate():
     self.initial_values = self.monte_carlo_gpi.action_values.copy()
 
     # set the seed used to choose random actions
+    # - this is applied to the evaluator of 'monte_carlo_gpi' at its first iteration
     self.seed = seed
-    if seed is not None:
-      np.random.seed(seed=seed)
 
 
     # helper function to display grid information
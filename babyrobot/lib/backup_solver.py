@@ -0,0 +1,226 @@
+# Copyright (c) Steve Roberts
+# Distributed under the terms of the Modified BSD License.
+
+import heapq
+from collections import deque
+import numpy as np
+
+
+class BackupSolver():
+  '''
+    In-place solvers for Bellman equations of the form:
+
+      v(s) = max_a [ c(s,a) + Σ_k w(s,a,k) * v(n(s,a,k)) ]
+
+    - for value iteration the maximum is taken over the actions available in each state
+    - for policy evaluation each state has a single 'action', combining all the actions of the policy
+
+    Unlike a synchronous (Jacobi) sweep, which only uses the values from the previous sweep, each
+    backup immediately uses the latest values of the next states. Two solvers are available:
+
+    - 'gauss_seidel': sweep through the states in place, in order of their distance from the exit,
+      so that value information travels along a whole corridor in a single sweep
+    - 'prioritized': back up the states in order of their largest possible change in value. After
+      each backup the predecessors of the state are given a higher priority, so backups are only
+      done where they are needed
+
+    The values are held in a flat list, indexed by state, and the states marked as fixed keep their
+    supplied values.
+  '''
+
+  def __init__( self, constants: np.ndarray, next_states: np.ndarray, coefficients: np.ndarray,
+                valid: np.ndarray, fixed: np.ndarray ):
+    '''
+      - constants = (num_states,num_actions) constant term, c(s,a), of each action
+      - next_states = (num_states,num_actions,num_outcomes) next state, n(s,a,k), of each outcome
+      - coefficients = (num_states,num_actions,num_outcomes) weight, w(s,a,k), of each next state value
+      - valid = (num_states,num_actions) flag set for the actions that can be taken in each state
+      - fixed = (num_states) flag set for the states whose values aren't updated
+    '''
+    self.num_states = len(fixed)
+    self.fixed = fixed.tolist()
+
+    # for each state, the list of actions, each with its constant and list of (next state, weight) pairs
+    # - outcomes with zero weight are dropped and repeated next states are combined
+    self.actions = []
+    for state, (state_constants, state_next, state_coefficients, state_valid) in enumerate(zip(
+        constants.tolist(), next_states.tolist(), coefficients.tolist(), valid.tolist())):
+      actions = []
+      if not self.fixed[state]:
+        for constant, action_next, action_coefficients, is_valid in zip(state_constants, state_next, state_coefficients, state_valid):
+          if is_valid:
+            outcomes = {}
+            for next_state, coefficient in zip(action_next, action_coefficients):
+              if coefficient != 0:
+                outcomes[next_state] = outcomes.get(next_state,0) + coefficient
+            actions.append((constant, list(outcomes.items())))
+      self.actions.append(actions)
+
+    # for each state, the states that can move to it (including itself), with the largest
+    # weight given to its value
+    self.predecessors = [{} for _ in range(self.num_states)]
+    for state, actions in enumerate(self.actions):
+      for constant, outcomes in actions:
+        for next_state, coefficient in outcomes:
+          predecessors = self.predecessors[next_state]
+          predecessors[state] = max(predecessors.get(state,0), abs(coefficient))
+
+    self.backups = 0
+
+
+  def backup( self, values: list, state: int ) -> float:
+    ''' return the new value of a state, calculated from the current values of its next states '''
+    best_value = -np.inf
+    for constant, outcomes in self.actions[state]:
+      value = constant
+      for next_state, coefficient in outcomes:
+        value += coefficient * values[next_state]
+      if value > best_value:
+        best_value = value
+    return best_value
+
+
+  def get_terminating_states( self ) -> list:
+    ''' return a list flagging the states that are certain to reach a fixed state, whichever outcomes
+        occur (for a single action per state). Without discounting, only these states have a finite value.
+    '''
+    def can_reach(targets):
+      # search backwards from all of the targets
+      reached = list(targets)
+      queue = deque(state for state in range(self.num_states) if targets[state])
+      while queue:
+        state = queue.popleft()
+        for predecessor in self.predecessors[state]:
+          if not reached[predecessor]:
+            reached[predecessor] = True
+            queue.append(predecessor)
+      return reached
+
+    # states that can never reach a fixed state are trapped, as are all states that can reach them
+    trapped = [not reached for reached in can_reach(self.fixed)]
+    if not any(trapped):
+      return [True] * self.num_states
+    return [not reached for reached in can_reach(trapped)]
+
+
+  def fix_states( self, states: list ):
+    ''' stop the values of the supplied states from being updated '''
+    for state in states:
+      self.fixed[state] = True
+      self.actions[state] = []
+
+
+  def get_distance_order( self, end_state: int ) -> list:
+    ''' return the states that aren't fixed, ordered by the number of steps needed to reach the
+        exit from each state (found by a breadth-first search backwards from the exit)
+        - states that can't reach the exit are placed last
+    '''
+    distance = [None] * self.num_states
+    distance[end_state] = 0
+    order = []
+    queue = deque([end_state])
+    while queue:
+      state = queue.popleft()
+      if not self.fixed[state]:
+        order.append(state)
+      for predecessor in self.predecessors[state]:
+        if distance[predecessor] is None and predecessor != state:
+          distance[predecessor] = distance[state] + 1
+          queue.append(predecessor)
+
+    unreached = [state for state in range(self.num_states) if (distance[state] is None) and not self.fixed[state]]
+    return order + unreached
+
+
+  def gauss_seidel( self, values: list, order: list, max_iterations = 100, threshold = 1e-3, on_sweep = None ):
+    ''' sweep through the states in the supplied order, updating each value in place, until the largest
+        change in a sweep falls below the threshold or the maximum number of sweeps is reached
+        - if supplied, 'on_sweep' is called after each sweep with the largest change and the number
+          of backups, and can stop the run by returning True
+
+        returns:
+        - the number of sweeps
+        - the values at the start of the last sweep
+    '''
+    start_values = list(values)
+    for iteration in range(1,max_iterations+1):
+      start_values = list(values)
+      delta = 0
+      for state in order:
+        value = self.backup( values, state )
+        change = abs(value - values[state])
+        if change > delta:
+          delta = change
+        values[state] = value
+      self.backups += len(order)
+
+      if on_sweep is not None and on_sweep( delta, len(order) ):
+        break
+      if delta < threshold:
+        break
+    return iteration, start_values
+
+
+  def prioritized_sweeping( self, values: list, max_backups: int, threshold = 1e-3, on_sweep = None ) -> int:
+    ''' back up the state with the largest possible change in value, until no state can change
+        by more than the threshold or the maximum number of backups is reached
+        - if supplied, 'on_sweep' is called after each block of 'num_states' backups (and after
+          the last backup) with the largest priority, which bounds the change still possible in
+          any state, and the number of backups in the block. It can stop the run by returning True
+
+        The priority of each state is a bound on how much its value can change. After a state is
+        backed up, the priority of each of its predecessors is increased by the change in value,
+        multiplied by the weight the predecessor gives to that state.
+
+        returns the number of backups
+    '''
+    backups = 0
+    priority = [0.0] * self.num_states
+    queue = []
+
+    # start with the amount each state would change if it was backed up now
+    for state in range(self.num_states):
+      if self.actions[state]:
+        priority[state] = abs(self.backup( values, state ) - values[state])
+        backups += 1
+        if priority[state] >= threshold:
+          queue.append((-priority[state], state))
+    heapq.heapify(queue)
+
+    # the number of backups at the start of the current block
+    block_start = 0
+
+    while queue and (backups < max_backups):
+      if on_sweep is not None and (backups - block_start) >= self.num_states:
+        if on_sweep( max(priority), backups - block_start ):
+          break
+        block_start = backups
+
+      negative_priority, state = heapq.heappop(queue)
+
+      # skip entries that have been replaced by a higher priority
+      if -negative_priority != priority[state]:
+        continue
+
+      value = self.backup( values, state )
+      change = abs(value - values[state])
+      values[state] = value
+      priority[state] = 0.0
+      backups += 1
+
+      if not (change > 0):
+        continue
+
+      # the values of the states that lead to this state may now change
+      for predecessor, coefficient in self.predecessors[state].items():
+        if self.actions[predecessor]:
+          priority[predecessor] += coefficient * change
+          if priority[predecessor] >= threshold:
+            heapq.heappush(queue, (-priority[predecessor], predecessor))
+
+    else:
+      if on_sweep is not None and backups > block_start:
+        on_sweep( max(priority, default=0.0), backups - block_start )
+
+    self.backups += backups
+    return backups
@@ -0,0 +1,137 @@
+# Copyright (c) Steve Roberts
+# Distributed under the terms of the Modified BSD License.
+
+import numpy as np
+from ..envs import BabyRobotInterface
+from ..envs.lib import Actions
+from ..envs.lib.dynamic_space import Dynamic
+from .policy import Policy
+
+
+class BatchRollout():
+  '''
+    Run a batch of episodes at the same time, following a policy in a level.
+
+    - the state, step count and termination of every episode are held in NumPy arrays, so each
+      step moves every running episode at once. Episodes are removed from the running set as
+      they reach the exit (or are truncated after the environment's 'max_episode_steps')
+    - actions are chosen from the policy's table of action probabilities ('get_action_probability_array'),
+      so the policy must be stationary. States where the policy has no actions choose at random
+      from the available actions, as done by 'Policy.get_action'
+    - with probability 'epsilon' a random action is taken instead of the policy's action
+    - the outcome of each action is sampled from the level's compiled transition model
+
+    The episodes use the batch's own random number generator rather than those of the environment
+    and policy, so follow a different random sequence to episodes run with 'env.step'.
+  '''
+
+  def __init__(self, env: BabyRobotInterface, policy: Policy, epsilon = 0, seed = None):
+    self.env = env
+    self.policy = policy
+    self.epsilon = epsilon
+    self.np_random = np.random.default_rng(seed)
+
+
+  def get_random_actions(self) -> np.ndarray:
+    ''' return a (num_states,5) boolean array of the actions that can be chosen at random in each state
+        - for a dynamic action space these are the moves available in each state,
+          otherwise all actions can be chosen
+    '''
+    level = self.env.level
+    num_states = self.env.width * self.env.height
+    if isinstance(self.env.action_space, Dynamic):
+      model = level.get_transition_model()
+      directions = level.get_cached_directions().reshape(-1)
+      random_actions = (directions[:,None] & model.action_directions[None,:]) > 0
+    else:
+      random_actions = np.ones((num_states,len(Actions)),dtype=bool)
+
+    # stay in the same state if there are no actions to choose from
+    random_actions[~random_actions.any(axis=1),Actions.Stay] = True
+    return random_actions
+
+
+  def get_action_tables(self) -> tuple:
+    ''' return the (num_states,5) cumulative probabilities used to choose the policy's action,
+        and a random action, in each state
+    '''
+    num_states = self.env.width * self.env.height
+    random_probabilities = self.get_random_actions().astype(float)
+    random_probabilities /= random_probabilities.sum(axis=1,keepdims=True)
+
+    # states with no policy actions choose at random
+    policy_probabilities = np.array(self.policy.get_action_probability_array(),dtype=float).reshape(num_states,-1)
+    no_actions = policy_probabilities.sum(axis=1) == 0
+    policy_probabilities[no_actions] = random_probabilities[no_actions]
+
+    policy_cumulative = np.cumsum(policy_probabilities,axis=1)
+    policy_cumulative /= policy_cumulative[:,-1:]
+    random_cumulative = np.cumsum(random_probabilities,axis=1)
+    random_cumulative /= random_cumulative[:,-1:]
+    return policy_cumulative, random_cumulative
+
+
+  @staticmethod
+  def sample( cumulative: np.ndarray, uniforms: np.ndarray ) -> np.ndarray:
+    ''' select an entry from each row of cumulative probabilities, using one uniform random number per row '''
+    return np.minimum(np.sum(cumulative <= uniforms[:,None], axis=1), cumulative.shape[1] - 1)
+
+
+  def run(self, start_positions: list) -> list:
+    ''' run an episode from each of the [x,y] start positions
+
+        returns a list with the arrays of each episode, in the order of the start positions:
+        - the states, as flat indices (y * width) + x, in which each action was taken
+        - the actions
+        - the rewards received for the actions
+    '''
+    model = self.env.level.get_transition_model()
+    policy_cumulative, random_cumulative = self.get_action_tables()
+
+    width = self.env.width
+    end_state = model.get_state( self.env.end[0], self.env.end[1] )
+    max_steps = self.env.max_episode_steps
+
+    # the index and current state of each running episode
+    num_episodes = len(start_positions)
+    episodes = np.arange(num_episodes)
+    states = np.array([(y * width) + x for x, y in start_positions], dtype=int).reshape(-1)
+
+    # the episode, state, action and reward of each step, for all running episodes
+    step_episodes, step_states, step_actions, step_rewards = [], [], [], []
+    steps = 0
+    while len(episodes) > 0:
+
+      # choose the policy's action, or a random action with probability epsilon
+      actions = self.sample( policy_cumulative[states], self.np_random.random(len(states)) )
+      if self.epsilon > 0:
+        explore = self.np_random.random(len(states)) < self.epsilon
+        if explore.any():
+          actions[explore] = self.sample( random_cumulative[states[explore]], self.np_random.random(explore.sum()) )
+
+      # sample the outcome of each action
+      outcomes = self.sample( model.cumulative[states,actions], self.np_random.random(len(states)) )
+      rewards = model.rewards[states,actions,outcomes]
+
+      step_episodes.append(episodes)
+      step_states.append(states)
+      step_actions.append(actions)
+      step_rewards.append(rewards)
+
+      # move to the next states and remove the episodes that have terminated
+      states = model.next_states[states,outcomes]
+      steps += 1
+      running = states != end_state
+      if max_steps is not None and steps > max_steps:
+        running[:] = False
+      episodes = episodes[running]
+      states = states[running]
+
+    # group the steps by episode, keeping them in the order they were taken
+    step_episodes = np.concatenate(step_episodes)
+    order = np.argsort(step_episodes, kind='stable')
+    lengths = np.bincount(step_episodes, minlength=num_episodes)
+    splits = np.cumsum(lengths)[:-1]
+    return list(zip(np.split(np.concatenate(step_states)[order], splits),
+                    np.split(np.concatenate(step_actions)[order], splits),
+                    np.split(np.concatenate(step_rewards)[order], splits)))
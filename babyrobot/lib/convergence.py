@@ -0,0 +1,93 @@
+# Copyright (c) Steve Roberts
+# Distributed under the terms of the Modified BSD License.
+
+import json
+import math
+import time
+
+
+class ConvergenceHistory():
+  '''
+    A record of the progress of an iterative solver, such as 'ValueIteration' or 'PolicyEvaluation'.
+
+    For each iteration (a sweep through the states) this holds:
+    - the largest change in a state value
+    - the number of state (Bellman) backups
+    - the wall-clock time, in seconds
+
+    An optional callback is called after each iteration with this history and can stop
+    the run early by returning True.
+  '''
+
+  def __init__(self, solver: str, threshold: float, callback = None):
+    self.solver = solver
+    self.threshold = threshold
+    self.callback = callback
+
+    self.deltas = []
+    self.backups = []
+    self.sweep_times = []
+
+    # set if the change in value fell below the threshold, or if the callback stopped the run
+    self.converged = False
+    self.stopped = False
+
+    self.last_time = time.perf_counter()
+
+
+  @property
+  def iterations(self) -> int:
+    return len(self.deltas)
+
+  @property
+  def total_backups(self) -> int:
+    return sum(self.backups)
+
+  @property
+  def total_time(self) -> float:
+    return sum(self.sweep_times)
+
+
+  def record(self, delta: float, backups: int) -> bool:
+    ''' add the results of an iteration
+
+        returns True if the run should stop, either because the change in value is below the
+        threshold or because the callback has asked for it to stop
+    '''
+    now = time.perf_counter()
+    self.sweep_times.append(now - self.last_time)
+    self.last_time = now
+    self.deltas.append(float(delta))
+    self.backups.append(int(backups))
+
+    self.converged = bool(delta < self.threshold)
+    if (self.callback is not None) and self.callback(self) and not self.converged:
+      self.stopped = True
+    return self.converged or self.stopped
+
+
+  def to_dict(self) -> dict:
+    ''' return the history as a dictionary of plain values
+        - any change in value that isn't finite (e.g. due to states with no value) is given as None
+    '''
+    return {'solver': self.solver,
+            'threshold': self.threshold,
+            'iterations': self.iterations,
+            'converged': self.converged,
+            'stopped': self.stopped,
+            'total_backups': self.total_backups,
+            'total_time': self.total_time,
+            'deltas': [delta if math.isfinite(delta) else None for delta in self.deltas],
+            'backups': self.backups,
+            'sweep_times': self.sweep_times}
+
+
+  def to_json(self, filename: str = None, **kwargs) -> str:
+    ''' return the history as a JSON string, also writing it to the file if a filename is given
+        - any keyword arguments are passed to 'json.dumps'
+    '''
+    text = json.dumps(self.to_dict(), **kwargs)
+    if filename is not None:
+      with open(filename, 'w') as json_file:
+        json_file.write(text)
+    return text
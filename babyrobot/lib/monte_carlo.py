@@ -4,24 +4,57 @@
 import numpy as np
 from tqdm import tqdm
 from enum import IntEnum
+from multiprocessing import get_context
 import babyrobot
 from ..envs import BabyRobotInterface
 from ..envs.lib import Actions
 from ..lib import Policy
+from .batch_rollout import BatchRollout
 
 
 class DeltaType(IntEnum):
     Max, Mean = range(2)
 
 
+# the copy of the Monte Carlo method used by each worker process of a parallel run
+worker_monte_carlo = None
+
+
+def attach_monte_carlo( monte_carlo ):
+  ''' store the worker process's copy of the Monte Carlo method '''
+  global worker_monte_carlo
+  worker_monte_carlo = monte_carlo
+
+
+def run_monte_carlo_task( task ) -> tuple:
+  ''' run a set of episodes in a worker process, starting from empty statistics
+
+      returns the sum of the returns and the count of the visits for each state (or state action)
+  '''
+  seed_sequence, last_start_pos, num_episodes, batch_size = task
+  monte_carlo = worker_monte_carlo
+  monte_carlo.visits[...] = 0
+  monte_carlo.returns[...] = 0
+  monte_carlo.seed_generators( seed_sequence )
+  monte_carlo.last_start_pos = last_start_pos
+
+  for episode in monte_carlo.generate_episodes(num_episodes, batch_size):
+    monte_carlo.add_episode( episode )
+  return monte_carlo.returns * monte_carlo.visits, monte_carlo.visits
+
 
 class MonteCarlo():
 
   last_start_pos = None         # the episode start position
+  epsilon = 0                   # the probability of taking a random action
+  batch_rollout = None          # the engine used to run batches of episodes
+  seed_sequence = None          # the source of the seeds of each set of episodes in a parallel run
+  chunk_size = 4096             # the number of steps in each chunk of a streamed episode
+  episode_number = -1           # the number of the episode whose returns are being calculated
   rewards: np.array             # rewards array to be initialised by child class
   values: np.array              # values array to be initialised by child class
 
-  def __init__(self, policy: Policy, exploring_starts=False, every_visit=False, env=None, **env_setup):
+  def __init__(self, policy: Policy, exploring_starts=False, every_visit=False, env=None, seed=None, **env_setup):
 
     # store the setup used to define the environment
     self.env_setup = env_setup
@@ -39,6 +72,9 @@ class MonteCarlo():
       # use the supplied environment
       self.env = env
 
+    # the seed applied to the environment when it's reset for the first episode
+    self.env_seed = seed
+
 
   #
   # Graphical Helper Functions
@@ -96,31 +132,259 @@ class MonteCarlo():
     return self.last_start_pos
 
 
-  def single_episode(self):
+  def choose_action(self):
+    ''' return the action to take in the environment's current state - virtual base method '''
+    raise NotImplementedError()
+
+
+  def get_keys(self, states, actions):
     '''
-      run a single episode to collect the reward for each action of the trajectory
-      - virtual base method
+      return the indices, into the flattened 'returns' and 'visits' arrays, of the state
+      (or state action) of each step - virtual base method
     '''
     raise NotImplementedError()
 
 
-  def get_returns(self):
-    raise NotImplementedError()
+  def reset_env(self):
+    ''' reset the environment at the start of an episode, seeding it on the first episode '''
+    state,info = self.env.reset(seed=self.env_seed)
+    self.env_seed = None
+    return state,info
 
 
-  def run(self, max_episodes = 1, delta_interval = 10, delta_type = DeltaType.Max, hide_progress = False):
+  def get_chunk_buffers(self, chunk_size):
+    ''' return the arrays used to hold the states, actions and rewards of each chunk of a streamed episode
+        - these are created once and reused by every episode
+    '''
+    buffers = getattr(self,'chunk_buffers',None)
+    if buffers is None or len(buffers[0]) != chunk_size:
+      buffers = (np.zeros(chunk_size,dtype=int), np.zeros(chunk_size,dtype=int), np.zeros(chunk_size))
+      self.chunk_buffers = buffers
+    return buffers
 
-    deltas = []
-    for episode in (pbar:=tqdm(range(max_episodes), disable=hide_progress)):
 
-      initial_values = self.returns.copy()
+  def stream_episode(self, chunk_size = None):
+    '''
+      run a single episode, yielding the steps of the trajectory in chunks of at most 'chunk_size' steps
+
+      - each chunk is given as arrays of the state, as the flat index (y * width) + x, the action
+        and the reward of each step
+      - the chunks are views of buffers that are reused by the next chunk, so copy them if they need
+        to be kept. This keeps the memory used constant, however long the episode.
+    '''
+    chunk_size = self.chunk_size if chunk_size is None else chunk_size
+    states, actions, rewards = self.get_chunk_buffers(chunk_size)
+
+    state,info = self.reset_env()
+    terminated = False
+    steps = 0
+    while not terminated:
+      # get the action to take in the current state
+      action = self.choose_action()
+      states[steps] = (state[1] * self.env.width) + state[0]
+      actions[steps] = action
+
+      state, reward, terminated, truncated, info = self.env.step(action)
+      rewards[steps] = reward
+      steps += 1
+
+      if steps == chunk_size or terminated:
+        yield states[:steps], actions[:steps], rewards[:steps]
+        steps = 0
+
+
+  def single_episode(self):
+    '''
+      run a single episode to collect the reward for each action of the trajectory
+      - returns arrays of the state, as the flat index (y * width) + x, the action and the reward of each step
+    '''
+    chunks = [[array.copy() for array in chunk] for chunk in self.stream_episode()]
+    return tuple(np.concatenate(arrays) for arrays in zip(*chunks))
 
+
+  def stream_episodes(self, max_episodes, chunk_size = None):
+    ''' yield a generator of the chunks of each episode (see 'stream_episode')
+        - the chunks of each episode must be used before moving to the next episode
+    '''
+    for episode in range(max_episodes):
       # set the next start position
       self.env.set_initial_pos(self.get_next_start_state())
+      yield self.stream_episode(chunk_size)
+
+
+  def rewards_to_returns(self, episode):
+    ''' convert the rewards of a complete episode into returns
+
+        - the episode is given as arrays of the states, actions and rewards of each step, as
+          returned by 'single_episode', and the same arrays are returned with the rewards replaced
+          by the returns
+        - the return of each step is the sum of the rewards from that step to the end of the episode (γ = 1),
+          found as a cumulative sum of the reversed rewards
+    '''
+    states, actions, rewards = episode
+    returns = np.cumsum(rewards[::-1])[::-1]
+    return states, actions, returns
+
+
+  def get_returns(self, returns):
+    ''' add the returns of a complete episode, from 'rewards_to_returns', into the average returns
+        - for first-visit only the return of the first step with each key is used, otherwise
+          every return is added into the average of its key
+    '''
+    states, actions, returns = returns
+    keys, first, inverse, counts = np.unique(self.get_keys(states, actions), return_index=True,
+                                             return_inverse=True, return_counts=True)
+    if self.every_visit:
+      # add together all the returns of each key
+      episode_returns = np.zeros(len(keys))
+      np.add.at(episode_returns, inverse, returns)
+      self.add_returns(keys, episode_returns, counts)
+    else:
+      self.add_returns(keys, returns[first], 1)
+
+
+  def add_returns(self, keys, episode_returns, counts):
+    ''' add the total returns of the keys visited in an episode into the average returns
+        - 'counts' is the number of returns included in the total of each key
+    '''
+    visits = self.visits.reshape(-1)
+    average_returns = self.returns.reshape(-1)
+    new_visits = visits[keys] + counts
+    average_returns[keys] = ((visits[keys] * average_returns[keys]) + episode_returns) / new_visits
+    visits[keys] = new_visits
+
+
+  #
+  # Streamed Returns
+  #
+  # The return of a step is the total reward of the episode less the reward received before the
+  # step, so the returns of a streamed episode are found by keeping, for each key, the reward
+  # received before its first visit (or the sum of these over every visit) and subtracting this
+  # from the total once the episode is complete. This only uses arrays with one entry per key,
+  # however long the episode.
+  #
+
+  def start_episode_returns(self):
+    ''' clear the record of the keys visited in the episode, creating the arrays if necessary '''
+    num_keys = self.returns.size
+    if getattr(self,'episode_stamps',None) is None or len(self.episode_stamps) != num_keys:
+      self.episode_stamps = np.full(num_keys,-1)        # the last episode in which each key was visited
+      self.episode_keys = np.zeros(num_keys,dtype=int)  # the keys visited in this episode
+      self.first_rewards = np.zeros(num_keys)           # the reward received before the first visit
+      self.visit_rewards = np.zeros(num_keys)           # the sum of the reward received before every visit
+      self.visit_counts = np.zeros(num_keys,dtype=int)  # the number of visits to each key
+      self.episode_number = -1
+
+    self.episode_number += 1
+    self.num_episode_keys = 0
+    self.episode_reward = 0.0
+
+
+  def add_chunk_returns(self, states, actions, rewards):
+    ''' add a chunk of the steps of an episode into the record of the keys visited '''
+    keys = self.get_keys(states, actions)
+
+    # the total reward received before each step of the chunk
+    cumulative_rewards = np.cumsum(rewards)
+    prior_rewards = self.episode_reward + np.concatenate(([0.0], cumulative_rewards[:-1]))
+
+    # find the keys visited for the first time in this episode
+    chunk_keys, first = np.unique(keys, return_index=True)
+    first_visit = self.episode_stamps[chunk_keys] != self.episode_number
+    new_keys = chunk_keys[first_visit]
+    self.episode_stamps[new_keys] = self.episode_number
+    self.episode_keys[self.num_episode_keys:self.num_episode_keys + len(new_keys)] = new_keys
+    self.num_episode_keys += len(new_keys)
+    self.first_rewards[new_keys] = prior_rewards[first[first_visit]]
+
+    if self.every_visit:
+      self.visit_rewards[new_keys] = 0
+      self.visit_counts[new_keys] = 0
+      np.add.at(self.visit_rewards, keys, prior_rewards)
+      np.add.at(self.visit_counts, keys, 1)
+
+    self.episode_reward += cumulative_rewards[-1]
+
+
+  def end_episode_returns(self):
+    ''' add the returns of the completed episode into the average returns '''
+    keys = self.episode_keys[:self.num_episode_keys]
+    if self.every_visit:
+      counts = self.visit_counts[keys]
+      self.add_returns(keys, (counts * self.episode_reward) - self.visit_rewards[keys], counts)
+    else:
+      self.add_returns(keys, self.episode_reward - self.first_rewards[keys], 1)
+
+
+  def add_episode(self, chunks):
+    ''' add the returns of an episode, given as an iterable of (states, actions, rewards) chunks,
+        into the average returns
+    '''
+    self.start_episode_returns()
+    for states, actions, rewards in chunks:
+      self.add_chunk_returns(states, actions, rewards)
+    self.end_episode_returns()
+
+
+  def get_batch_rollout(self):
+    ''' return the engine used to run batches of episodes, seeding it on the first batch '''
+    if self.batch_rollout is None:
+      self.batch_rollout = BatchRollout(self.env, self.policy, self.epsilon, seed=self.env_seed)
+      self.env_seed = None
+    return self.batch_rollout
+
+
+  def generate_episodes(self, max_episodes, batch_size = None):
+    ''' yield each episode as an iterable of (states, actions, rewards) chunks
+
+        - by default each episode is streamed, by 'stream_episode', through the environment
+        - if a batch size is given the episodes are run together, in batches, by 'BatchRollout'
+          and each episode is a single chunk
+    '''
+    if batch_size is None:
+      yield from self.stream_episodes(max_episodes)
+      return
 
-      rewards = self.single_episode()
-      returns = self.rewards_to_returns(rewards)
-      self.get_returns(returns)
+    rollout = self.get_batch_rollout()
+    for first_episode in range(0, max_episodes, batch_size):
+      num_episodes = min(batch_size, max_episodes - first_episode)
+      start_positions = [self.get_next_start_state() for episode in range(num_episodes)]
+      for episode in rollout.run(start_positions):
+        yield (episode,)
+
+
+  def seed_generators(self, seed_sequence: np.random.SeedSequence):
+    ''' give the environment, the policy and the method their own random number generators,
+        each seeded from the supplied seed sequence
+    '''
+    env_seed, policy_seed, own_seed = (int(child.generate_state(1)[0]) for child in seed_sequence.spawn(3))
+    self.env_seed = env_seed
+    self.batch_rollout = None
+    self.policy.seed(policy_seed)
+    self.np_random = np.random.default_rng(own_seed)
+
+
+  def run(self, max_episodes = 1, delta_interval = 10, delta_type = DeltaType.Max, hide_progress = False,
+          batch_size = None, num_workers = None):
+    ''' run 'max_episodes' episodes, updating the average returns after each
+        - if 'batch_size' is given the episodes are run in batches of this size by 'BatchRollout',
+          which is much faster than running each episode through the environment
+        - if 'num_workers' is given the episodes are shared between this number of worker processes
+          (see 'run_parallel')
+    '''
+    if num_workers is not None:
+      return self.run_parallel(max_episodes, delta_interval, delta_type, hide_progress, batch_size, num_workers)
+
+    episodes = self.generate_episodes(max_episodes, batch_size)
+
+    deltas = []
+    for episode in (pbar:=tqdm(range(max_episodes), disable=hide_progress)):
+
+      # keep the values at the start of the episodes where the change is measured
+      if episode%delta_interval == 0:
+        initial_values = self.returns.copy()
+
+      self.add_episode(next(episodes))
 
       # save the change in the calculated values at regular intervals
       if episode%delta_interval == 0:
@@ -135,6 +399,60 @@ class MonteCarlo():
     return self.returns, self.visits, deltas
 
 
+  def run_parallel(self, max_episodes = 1, delta_interval = 10, delta_type = DeltaType.Max, hide_progress = False,
+                   batch_size = None, num_workers = None):
+    ''' run 'max_episodes' episodes, shared between a pool of worker processes
+
+        - the episodes are split into tasks of 'delta_interval' episodes (or 'batch_size', if this is larger)
+        - each task starts with empty statistics and its own random number generators, seeded from
+          a sequence created from the seed of the method, and returns the sum of the returns and
+          the count of the visits of each state
+        - the totals of all the tasks are combined, in order, to give the average returns, so these
+          are the same averages as calculated by a serial run of the same number of episodes
+        - a delta is recorded as each task is combined, giving the change in the average returns
+          due to the episodes of that task
+    '''
+    if self.seed_sequence is None:
+      self.seed_sequence = np.random.SeedSequence(self.env_seed)
+      self.env_seed = None
+
+    # split the episodes into tasks, each starting where the previous task finished
+    episodes_per_task = max(delta_interval, 1 if batch_size is None else batch_size)
+    tasks = []
+    for first_episode in range(0, max_episodes, episodes_per_task):
+      num_episodes = min(episodes_per_task, max_episodes - first_episode)
+      tasks.append((self.seed_sequence.spawn(1)[0], self.last_start_pos, num_episodes, batch_size))
+      if self.exploring_starts:
+        for episode in range(num_episodes):
+          self.get_next_start_state()
+
+    # the sum of the returns and the count of the visits, over all episodes
+    total_returns = self.returns * self.visits
+    self.visits = self.visits.copy()
+
+    deltas = []
+    with get_context().Pool(num_workers, initializer=attach_monte_carlo, initargs=(self,)) as pool:
+      with tqdm(total=max_episodes, disable=hide_progress) as pbar:
+        for task, (task_returns, task_visits) in zip(tasks, pool.imap(run_monte_carlo_task, tasks)):
+
+          # add the totals of the task and recalculate the average returns
+          initial_values = self.returns
+          total_returns += task_returns
+          self.visits += task_visits
+          self.returns = np.divide(total_returns, self.visits, out=np.zeros_like(total_returns), where=self.visits > 0)
+
+          # calculate the difference in the values due to the task
+          if delta_type == DeltaType.Max:
+            delta = np.max(np.abs(self.returns - initial_values))  # get the largest difference
+          else:
+            delta = np.mean(np.abs(self.returns - initial_values)) # get the average difference
+          deltas.append(delta)
+          pbar.update(task[2])
+          pbar.set_description(f"Delta {delta:0.5f}")
+
+    return self.returns, self.visits, deltas
+
+
 
 class MonteCarloStateValues( MonteCarlo ):
   ''' base class for Monte Carlo methods calculating state values '''
@@ -157,61 +475,14 @@ class MonteCarloStateValues( MonteCarlo ):
     return env
 
 
-  def rewards_to_returns(self, state_rewards):
-    ''' work backwards to convert the rewards into returns '''
-    γ = 1.0
-    G = 0
-    state_returns = []
-    for state, reward in reversed(state_rewards):
-      G = reward + γ*G
-      state_returns.append((state,G))
-
-    # put back into the order of states visited
-    state_returns.reverse()
-    return state_returns
-
-
-  def single_episode(self):
-    '''
-      run a single episode to collect the reward for each action of the trajectory
-    '''
-    state,info = self.env.reset()
-    state_rewards = []
-    total_reward = 0
-    terminated = False
-    while not terminated:
-      # get the policy's action in the current state
-      action = self.policy.get_action(self.env.x,self.env.y)
-
-      new_state, reward, terminated, truncated, info = self.env.step(action)
-      total_reward += reward
-      state_rewards.append((state,reward))
-      state = new_state
-
-    return state_rewards
-
+  def choose_action(self):
+    ''' get the policy's action in the current state '''
+    return self.policy.get_action(self.env.x,self.env.y)
 
-  def get_returns(self, state_returns):
-    ''' find the value of the first visit to a state '''
-    episode_visits = np.zeros((self.env.height,self.env.width))
 
-    # the first time a state is seen store the return value
-    for s, G in state_returns:
-
-      # if first-visit only process the state if it hasn't already been visited
-      if self.every_visit or episode_visits[s[1],s[0]] == 0:
-
-        # keep a count of the number of times this state is visited during this episode
-        episode_visits[s[1],s[0]] += 1
-
-        # increment the total count of first visits to this state
-        self.visits[s[1],s[0]] += 1
-
-        # get (1/visits) setting the result of any divide by zero to zero
-        inv_visits = 1 / self.visits[s[1],s[0]]
-
-        # only update the average returns of the states visited in this episode
-        self.returns[s[1],s[0]] = ((1 - inv_visits)*self.returns[s[1],s[0]]) + (inv_visits*G)
+  def get_keys(self, states, actions):
+    ''' the returns are averaged for each state '''
+    return states
 
 
 
@@ -219,7 +490,7 @@ class MonteCarloActionValues( MonteCarlo ):
   ''' base class for Monte Carlo methods calculating action values '''
 
   def __init__(self, policy: Policy, epsilon=0, env=None, seed=None, **setup):
-    super().__init__(policy, env=env, **setup)
+    super().__init__(policy, env=env, seed=seed, **setup)
 
     # set the probability of taking a random action
     self.epsilon = epsilon
@@ -230,9 +501,8 @@ class MonteCarloActionValues( MonteCarlo ):
     # the average returns for each action
     self.returns = np.zeros((self.env.height, self.env.width, len(Actions)))
 
-    # set the seed used to choose random actions
-    if seed is not None:
-      np.random.seed(seed=seed)    
+    # create the generator used to choose random actions
+    self.np_random = np.random.default_rng(seed)
 
 
   def get_graphical_environment(self, text_data):
@@ -243,126 +513,102 @@ class MonteCarloActionValues( MonteCarlo ):
     return env
 
 
-  def rewards_to_returns(self, rewards):
-    ''' work backwards to convert the rewards into returns '''
-    γ = 1.0
-    G = 0
-    returns = []
-    for state, action, reward in reversed(rewards):
-      G = γ*G + reward
-      returns.append((state,action,G))
-
-    # put back into the order of actions visited
-    returns.reverse()
-    return returns
-
-
-  def single_episode(self):
-    '''
-      run a single episode to collect the reward for each action of the trajectory
-    '''
-    state,info = self.env.reset()
-    action_rewards = []
-    total_reward = 0
-    terminated = False
-    while not terminated:
-
-      # probability of selecting a random action
-      p = np.random.random()
-
-      # if the probability is less than epsilon then a random action
-      # is chosen from the state's available actions
-      if p < self.epsilon:
-        action = self.env.action_space.sample()
-      else:
-        # get the policy's action in the current state
-        action = self.policy.get_action(self.env.x,self.env.y)
-
-      new_state, reward, terminated, truncated, info = self.env.step(action)
-      total_reward += reward
-      action_rewards.append((state,action,reward))
-      state = new_state
-
-    return action_rewards
-
-
-  def get_returns(self, returns):
-    ''' get the return values for each state '''
-
-    # the count of the number of times each action is visited during this episode
-    action_visits = np.zeros((self.env.height, self.env.width, len(Actions)))
-
-    # process every state-action pair in the supplied set of returns
-    for s, a, G in returns:
+  def choose_action(self):
+    ''' choose the policy's action in the current state, or a random action with probability epsilon '''
 
-      # if first-visit only process the action if it hasn't already been visited
-      if self.every_visit or action_visits[s[1],s[0],a] == 0:
+    # probability of selecting a random action
+    p = self.np_random.random()
 
-        # keep a count of the number of times this action is visited during this episode
-        action_visits[s[1],s[0],a] += 1
+    # if the probability is less than epsilon then a random action
+    # is chosen from the state's available actions
+    if p < self.epsilon:
+      return self.env.action_space.sample()
 
-        # increment the total count of first visits to this state action
-        self.visits[s[1],s[0],a] += 1
+    # get the policy's action in the current state
+    return self.policy.get_action(self.env.x,self.env.y)
 
-        # get (1/visits) setting the result of any divide by zero to zero
-        inv_visits = 1 / self.visits[s[1],s[0],a]
 
-        # only update the average returns of the state actions visited in this episode
-        self.returns[s[1],s[0],a] = ((1 - inv_visits)*self.returns[s[1],s[0],a]) + (inv_visits*G)
+  def get_keys(self, states, actions):
+    ''' the returns are averaged for each state action '''
+    return (states * len(Actions)) + actions
 
 
 
 
 class MonteCarloGPI():
-
-  def __init__(self, policy: Policy, evaluation_steps=1, epsilon=0.1, delta_type=DeltaType.Mean, **env_setup):    
+  '''
+    Monte Carlo generalised policy iteration: alternate between estimating the action values of
+    the current policy, with epsilon-greedy exploration, and acting greedily with respect to them.
+
+    - a single 'MonteCarloActionValues' evaluator is kept for the whole run, so its arrays,
+      random number generators and batch rollout engine are reused by every iteration
+    - the action values are the average of the returns of every episode run so far, and are
+      updated in place by the evaluator as the episodes of each iteration are added
+    - the 'evaluation_steps' episodes of each iteration are run together by 'BatchRollout', in
+      batches of 'batch_size' episodes (by default all of the iteration's episodes form one batch)
+  '''
+
+  def __init__(self, policy: Policy, evaluation_steps=1, epsilon=0.1, delta_type=DeltaType.Mean, batch_size=None, **env_setup):
     self.policy = policy
     self.evaluation_steps = evaluation_steps
     self.epsilon = epsilon
     self.delta_type = delta_type
+    self.batch_size = evaluation_steps if batch_size is None else batch_size
 
     # create an evaluation version of the environment
-    self.env = babyrobot.make("BabyRobot-v0", render_mode=None, **env_setup)    
+    self.env = babyrobot.make("BabyRobot-v0", render_mode=None, **env_setup)
 
-    # keep a count of the first visits to each action
-    self.visits = np.zeros((self.env.height, self.env.width, len(Actions)))
+    # the evaluator that keeps the count of the first visits to each action and the average returns
+    self.evaluator = MonteCarloActionValues(self.policy, epsilon = self.epsilon, env = self.env)
 
-    # the average returns for each action
-    self.action_values = np.zeros((self.env.height, self.env.width, len(Actions)))    
+    # the seed applied to the evaluator, which is only set once so that later iterations continue the random sequence
+    self.seed = None
 
     # keep track of the deltas over the run
     self.deltas = []
 
 
-  def do_iteration(self,seed=None):  
+  @property
+  def visits(self):
+    ''' the count of the first visits to each action '''
+    return self.evaluator.visits
 
-        initial_values = self.action_values.copy()     
 
-        mc = MonteCarloActionValues(self.policy, epsilon = self.epsilon, env = self.env, seed = seed)
-        eval_values, eval_visits, _ = mc.run(self.evaluation_steps, hide_progress = True)
+  @property
+  def action_values(self):
+    ''' the average returns for each action '''
+    return self.evaluator.returns
 
-        # increment the count of any actions that have been visited
-        self.visits += eval_visits
 
-        # get (1/visits) setting the result of any divide by zero to zero
-        inv_visits = np.reciprocal(self.visits, where=self.visits!=0)
+  def do_iteration(self,seed=None):
+    ''' run the evaluation episodes of the current policy and then improve the policy
+        - a seed is applied to the evaluator the first time it's supplied
 
-        # only update the average action values of the states visited in this episode
-        self.action_values = self.action_values + (inv_visits * (eval_values - (self.action_values*eval_visits)))
+        returns the change in the action values
+    '''
+    if seed is not None and self.seed is None:
+      self.seed = seed
+      self.evaluator.seed_generators( np.random.SeedSequence(seed) )
 
-        # update the policy with respect to the latest calculated action values
-        self.policy.update_policy(self.action_values)  
+    initial_values = self.action_values.copy()
 
-        # calculate the difference in the action values from the start to end of the iteration
-        if self.delta_type == DeltaType.Max:
-          delta = np.max(np.abs(self.action_values - initial_values))  # get the largest difference
-        else:
-          delta = np.mean(np.abs(self.action_values - initial_values)) # get the average difference      
+    # add the returns of the evaluation episodes into the average action values
+    for episode in self.evaluator.generate_episodes(self.evaluation_steps, self.batch_size):
+      self.evaluator.add_episode(episode)
+
+    # update the policy with respect to the latest calculated action values
+    self.policy.update_policy(self.action_values)
+
+    # calculate the difference in the action values from the start to end of the iteration
+    if self.delta_type == DeltaType.Max:
+      delta = np.max(np.abs(self.action_values - initial_values))  # get the largest difference
+    else:
+      delta = np.mean(np.abs(self.action_values - initial_values)) # get the average difference
 
-        # save the change in the action values 
-        self.deltas.append(delta)          
+    # save the change in the action values
+    self.deltas.append(delta)
 
-        return delta      
+    return delta
 
 
   # def run( self, max_iterations=10, evaluation_steps=1, epsilon=0.1, min_delta=None, delta_interval=1, delta_type=DeltaType.Mean ):
@@ -0,0 +1,160 @@
+# Copyright (c) Steve Roberts
+# Distributed under the terms of the Modified BSD License.
+
+import os
+import time
+import numpy as np
+from numpy import inf
+from multiprocessing import get_context, shared_memory
+
+from ..envs import BabyRobotInterface
+from .value_iteration import ValueIteration
+from .convergence import ConvergenceHistory
+
+
+# the shared memory blocks and the arrays that use them, attached in each worker process
+shared_blocks = []
+shared_arrays = {}
+
+
+def attach_shared_arrays( layout: dict ):
+  ''' attach to the shared memory blocks described by the layout, of the form {key: (name, shape, dtype)} '''
+  for key, (name, shape, dtype) in layout.items():
+    block = shared_memory.SharedMemory(name=name)
+    shared_blocks.append(block)
+    shared_arrays[key] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+
+def sweep_tile( task ) -> float:
+  ''' calculate the new values of the states in one tile of the grid
+
+      The values of the last sweep are read from one of the two shared value buffers and the new
+      values are written to the other, so no tile sees the partly updated values of another. The
+      halo of each tile (the row either side of it) is read directly from the shared buffer.
+
+      returns the largest change in the value of any state in the tile
+  '''
+  start, stop, source, discount_factor, end_state = task
+  old_values = shared_arrays[f'values_{source}']
+  new_values = ValueIteration.get_max_action_values( shared_arrays, old_values, discount_factor, start, stop )
+
+  # the exit always has zero value
+  if start <= end_state < stop:
+    new_values[end_state - start] = 0
+
+  delta = np.max(np.abs(new_values - old_values[start:stop]))
+
+  # set any -inf to NaN for states where no value calculated
+  new_values[new_values == -inf] = np.nan
+  shared_arrays[f'values_{1 - source}'][start:stop] = new_values
+  return delta
+
+
+class ParallelValueIteration(ValueIteration):
+  '''
+    Value iteration with each sweep split across a pool of worker processes.
+
+    - the grid is divided into tiles of whole rows, so each tile is a contiguous block of states
+      and only exchanges values with the tiles above and below it
+    - the transition arrays and two buffers of state values are held in shared memory, so they
+      aren't copied to the workers. Each sweep reads from one buffer and writes to the other,
+      so the tiles exchange their edge rows through the buffers between sweeps
+    - the largest change in value over all tiles is used to test for convergence
+
+    Each sweep calculates exactly the same values as a sweep of 'ValueIteration', so the results
+    of the two match.
+  '''
+
+  def __init__(self, env: BabyRobotInterface, discount_factor=0.9, num_workers=None, num_tiles=None):
+    super().__init__( env, discount_factor )
+
+    # the number of worker processes and the number of tiles the grid is split into
+    self.num_workers = os.cpu_count() if num_workers is None else num_workers
+    self.num_tiles = self.num_workers if num_tiles is None else num_tiles
+
+
+  def get_tiles(self) -> list:
+    ''' return the (start,stop) range of states of each tile, each holding a band of whole rows '''
+    num_tiles = max(1, min(self.num_tiles, self.level.height))
+    rows = np.linspace(0, self.level.height, num_tiles + 1).astype(int)
+    return [(int(first * self.level.width), int(last * self.level.width))
+            for first, last in zip(rows[:-1], rows[1:]) if last > first]
+
+
+  def create_shared_arrays(self) -> tuple:
+    ''' copy the transition arrays and the current state values into shared memory
+
+        returns:
+        - the list of shared memory blocks
+        - the arrays held in the blocks, keyed by name
+        - the layout used by the workers to attach to the blocks
+    '''
+    arrays = dict(self.get_backup())
+    values = self.values.reshape(-1)
+    arrays['values_0'] = values
+    arrays['values_1'] = values
+
+    blocks, shared, layout = [], {}, {}
+    try:
+      for key, array in arrays.items():
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes,1))
+        blocks.append(block)
+        shared[key] = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+        shared[key][...] = array
+        layout[key] = (block.name, array.shape, array.dtype.str)
+    except BaseException:
+      self.release_shared_arrays(blocks)
+      raise
+    return blocks, shared, layout
+
+
+  @staticmethod
+  def release_shared_arrays( blocks: list ):
+    ''' free the shared memory blocks '''
+    for block in blocks:
+      block.close()
+      block.unlink()
+
+
+  def run_to_convergence(self, max_iterations = 100, threshold = 1e-3, callback = None):
+    ''' run multiple state sweeps, in parallel, until the maximum change in the state value
+        falls below the supplied threshold or the maximum number of iterations is reached
+        - the progress of each sweep is recorded in 'convergence' and the optional callback
+          can stop the run, as for 'ValueIteration'
+    '''
+    history = ConvergenceHistory( 'parallel', threshold, callback )
+    self.convergence = history
+    backups = (self.level.width * self.level.height) - 1
+
+    end = self.level.end
+    end_state = (end[1] * self.level.width) + end[0]
+    tiles = self.get_tiles()
+
+    blocks, shared, layout = self.create_shared_arrays()
+    try:
+      source = 0
+      with get_context().Pool(self.num_workers, initializer=attach_shared_arrays, initargs=(layout,)) as pool:
+
+        # time the sweeps from here, so the first sweep doesn't include the setup of the shared memory and workers
+        history.last_time = time.perf_counter()
+        for n in range(max_iterations):
+
+          # calculate the new values of every tile and get the largest state value difference
+          tasks = [(start, stop, source, self.discount_factor, end_state) for start, stop in tiles]
+          delta = np.max(pool.map(sweep_tile, tasks))
+          self.backups += backups
+
+          # the new values become the source of the next sweep
+          source = 1 - source
+
+          # test if the difference is less than the defined convergence threshold
+          if history.record( delta, backups ):
+            break
+
+      self.values = shared[f'values_{source}'].reshape(self.level.height,self.level.width).copy()
+    finally:
+      del shared
+      self.release_shared_arrays(blocks)
+
+    # return the number of iterations taken to converge
+    return history.iterations
@@ -0,0 +1,165 @@
+# Copyright (c) Steve Roberts
+# Distributed under the terms of the Modified BSD License.
+
+import os
+import time
+import itertools
+import numpy as np
+from multiprocessing import get_context
+
+from .utils import make
+from .policy import Policy
+from .value_iteration import ValueIteration
+
+
+# the levels built by each worker process, keyed by their structural setup, so that levels
+# are reused by later tasks in the same process
+level_cache = {}
+level_cache_size = 4
+
+
+def get_level( setup: dict ):
+  ''' return the level created from the setup, reusing a level already built by this process '''
+  key = repr(sorted(setup.items()))
+  if key not in level_cache:
+    if len(level_cache) >= level_cache_size:
+      level_cache.pop(next(iter(level_cache)))
+    level_cache[key] = make("BabyRobot-v0", render_mode=None, **setup).unwrapped
+  return level_cache[key]
+
+
+def solve_sweep_task( task ) -> list:
+  ''' solve the level with each set of parameters of a task
+
+      - the level is only created once, and each setting of the puddle properties is applied in place
+        (runs without puddle properties use those of the level setup)
+      - the transition arrays of the level are compiled once for each setting of the puddle properties
+        and reused for each discount factor and solver setting
+
+      returns a list of (index, result) pairs, one for each set of parameters
+  '''
+  setup, runs = task
+  level = get_level( setup )
+  grid_base = level.level.grid_base
+
+  results = []
+  value_iteration = ValueIteration( level )
+  for index, puddle_props, solver_parameters in runs:
+    # a level reused from an earlier task may have been left with other puddle properties, so
+    # the properties of the run (or of the level setup) are always applied if they differ
+    puddle_props = setup.get('puddle_props',{}) if puddle_props is None else puddle_props
+    if puddle_props != grid_base.puddle_props:
+      grid_base.set_puddle_props( puddle_props )
+
+    value_iteration.discount_factor = solver_parameters['discount_factor']
+    value_iteration.solver = solver_parameters['solver']
+    value_iteration.values = np.zeros((level.height,level.width))
+
+    start_time = time.perf_counter()
+    value_iteration.run_to_convergence( solver_parameters['max_iterations'], solver_parameters['threshold'] )
+    solve_time = time.perf_counter() - start_time
+
+    policy = Policy( level )
+    directions = policy.calculate_greedy_directions( value_iteration.values, value_iteration.discount_factor )
+
+    results.append((index, {'values': value_iteration.values,
+                            'policy': directions,
+                            'iterations': value_iteration.convergence.iterations,
+                            'converged': value_iteration.convergence.converged,
+                            'solve_time': solve_time}))
+  return results
+
+
+class ParameterSweep():
+  '''
+    Solve a level, with value iteration, for every combination of a grid of parameters.
+
+    - 'base_setup' is the setup of the level, as supplied to 'make'
+    - 'parameter_grid' is a dictionary giving a list of values for each parameter to vary, for example:
+
+        {'discount_factor': [0.9, 0.99], 'puddle_props': [{'large_prob': 0.4}, {'large_prob': 0.2}]}
+
+    Each parameter is one of:
+    - a solver parameter: 'discount_factor', 'solver', 'threshold' or 'max_iterations'
+    - 'puddle_props': these only change the rewards and probabilities of the level, so are applied
+      to an existing level rather than creating a new one
+    - any other level setup parameter (for example 'maze_seed'), which needs a new level
+
+    The runs are grouped by level and split between a pool of worker processes. Each worker
+    creates each level it's given once and reuses it, and its compiled transition arrays, for
+    all the runs that only change the solver parameters or puddle properties.
+  '''
+
+  # the solver parameters and their default values
+  solver_defaults = {'discount_factor': 0.9, 'solver': 'sweep', 'threshold': 1e-3, 'max_iterations': 1000}
+
+  def __init__(self, base_setup: dict, parameter_grid: dict, num_workers = None):
+    self.base_setup = dict(base_setup)
+    self.parameter_grid = dict(parameter_grid)
+    self.num_workers = os.cpu_count() if num_workers is None else num_workers
+
+
+  def get_parameters(self) -> list:
+    ''' return a list of dictionaries, holding every combination of the parameter values '''
+    names = list(self.parameter_grid)
+    return [dict(zip(names, values)) for values in itertools.product(*self.parameter_grid.values())]
+
+
+  def get_tasks(self, parameters: list) -> list:
+    ''' group the runs by level setup and split them into tasks for the workers
+
+        returns a list of (level setup, runs) tasks, where each run is given by
+        (index, puddle properties, solver parameters)
+    '''
+    groups = {}
+    for index, run_parameters in enumerate(parameters):
+      setup = dict(self.base_setup)
+      solver_parameters = dict(self.solver_defaults)
+      puddle_props = None
+      for name, value in run_parameters.items():
+        if name in self.solver_defaults:
+          solver_parameters[name] = value
+        elif name == 'puddle_props':
+          puddle_props = value
+        else:
+          setup[name] = value
+
+      key = repr(sorted(setup.items()))
+      groups.setdefault(key, (setup, []))[1].append((index, puddle_props, solver_parameters))
+
+    # split the runs of each level so that all the workers have some to do, keeping the runs
+    # with the same puddle properties together
+    num_chunks = max(1, -(-self.num_workers // len(groups)))
+    tasks = []
+    for setup, runs in groups.values():
+      runs.sort(key=lambda run: repr(run[1]))
+      for chunk in np.array_split(np.arange(len(runs)), min(num_chunks, len(runs))):
+        tasks.append((setup, [runs[i] for i in chunk]))
+    return tasks
+
+
+  def run(self) -> list:
+    ''' solve the level for every combination of the parameters
+
+        returns a list with a row for each combination, in the order of the parameter grid,
+        holding the parameter values and:
+        - 'values': the (height,width) array of state values
+        - 'policy': the (height,width) direction bitfield of the greedy policy
+        - 'iterations': the number of value iteration sweeps
+        - 'converged': True if the values converged within the maximum number of sweeps
+        - 'solve_time': the time taken by value iteration, in seconds
+    '''
+    parameters = self.get_parameters()
+    tasks = self.get_tasks(parameters)
+
+    if self.num_workers <= 1:
+      task_results = [solve_sweep_task(task) for task in tasks]
+    else:
+      with get_context().Pool(min(self.num_workers, len(tasks))) as pool:
+        task_results = pool.map(solve_sweep_task, tasks)
+
+    table = [dict(run_parameters) for run_parameters in parameters]
+    for results in task_results:
+      for index, result in results:
+        table[index].update(result)
+    return table
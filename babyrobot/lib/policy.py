@@ -20,8 +20,12 @@ class Policy():
     # no directions are possible in the terminal state
     self.directions[level.end[1],level.end[0]] = 0
 
-    # set the seed used to choose random actions for a stochastic policy
-    np.random.seed(seed=seed)
+    # create the generator used to choose random actions for a stochastic policy
+    self.seed(seed)
+
+  def seed(self, seed = None):
+    ''' create the policy's own random number generator, from the supplied seed '''
+    self.np_random = np.random.default_rng(seed)
 
   def set_policy(self,directions):
     ''' set the policy (i.e. the action to take in each state) '''
@@ -39,7 +43,7 @@ class Policy():
       for x in range(self.level.width):
         if (x != end[0]) or (y != end[1]):
           available_actions = self.level.get_available_actions( x, y )
-          action = np.random.choice(available_actions)
+          action = self.np_random.choice(available_actions)
           direction = Direction.from_action(action)
           directions[y][x] = direction
     self.directions = directions
@@ -59,36 +63,82 @@ class Policy():
     '''
     greedy_directions = self.calculate_greedy_directions(values)
 
-    for row in range(self.directions.shape[0]):
-      for col in range(self.directions.shape[1]):
-        # if a single direction is specified the value will be a power of 2
-        n = greedy_directions[row,col]
-        power_of_two = (n & (n-1) == 0) and n != 0
-        if not power_of_two:
-          # more than one direction so use direction from last policy
-          greedy_directions[row,col] = self.directions[row,col]
+    # if a single direction is specified the value will be a power of 2
+    # - where there's more than one direction use the direction from the last policy
+    power_of_two = ((greedy_directions & (greedy_directions-1)) == 0) & (greedy_directions != 0)
 
     # update the policy
-    self.directions = greedy_directions
+    self.directions = np.where(power_of_two, greedy_directions, self.directions)
     return self.directions
 
-  def calculate_greedy_directions(self,values):
+  def calculate_greedy_directions(self,values,discount_factor=1.0):
     ''' given a set of state values calculate the directions by acting greedily
         i.e. move in the direction of greatest state value
+        - the discount factor is only applied to state values, not action values
+        - this gives the same directions as calling 'calculate_cell_directions', for state values,
+          or 'get_greedy_direction', for action values, on every state except the exit
     '''
-    # calculate the directions of all states except the exit
+    if len(values.shape) == 2:
+      # only the actions available in each state are considered, in the order they're returned
+      # by 'get_available_actions', and an action value of zero is a valid value
+      action_values = self.get_action_value_array(values,discount_factor)
+      actions = [Actions.North, Actions.South, Actions.East, Actions.West]
+      action_directions = np.array([Direction.from_action(action) for action in Actions])
+      available = (self.level.level.get_cached_directions()[:,:,None] & action_directions) > 0
+      allow_zero = True
+    else:
+      # all actions are considered, but only those with a non-zero value can be the best action
+      action_values = values
+      actions = list(Actions)
+      available = np.ones(action_values.shape,dtype=bool)
+      allow_zero = False
+
     directions = np.zeros((self.level.height,self.level.width),dtype=int)
+    best_value = np.full((self.level.height,self.level.width),-np.inf)
+    for action in actions:
+      dir_value = Direction.from_action(action)
+      action_value = action_values[:,:,action]
+
+      # if a best action has already been selected and the new action has a value
+      # very close to this, then add this action to the set of greedy actions
+      # (with the same tolerance as 'math.isclose')
+      with np.errstate(invalid='ignore'):
+        close = (action_value == best_value) | (np.isfinite(action_value) & np.isfinite(best_value) &
+                (np.abs(action_value - best_value) <= 1e-6 * np.maximum(np.abs(action_value),np.abs(best_value))))
+      add = available[:,:,action] & (directions > 0) & close
+      better = available[:,:,action] & ~add & (action_value > best_value)
+      if not allow_zero:
+        better &= (action_value != 0)
+
+      directions[add] += dir_value
+      directions[better] = dir_value
+      best_value[better] = action_value[better]
+
+    # no directions are possible in the terminal state
     end = self.level.end
-    for y in range(self.level.height):
-      for x in range(self.level.width):
-        if (x != end[0]) or (y != end[1]):
-          if len(values.shape) == 2:
-            directions[y,x] = self.calculate_cell_directions(x,y,values)
-          else:
-            directions[y,x] = self.get_greedy_direction(values[y][x])
+    directions[end[1],end[0]] = 0
     return directions
 
 
+  def get_action_value_array(self,values,discount_factor=1.0) -> np.ndarray:
+    ''' return a (height,width,5) array of the value of each action in every state, in the
+        order of the 'Actions' enum, calculated from the supplied state values
+        = sum(p(s',r|s,a)[r + γV(s')])
+        - only the possible outcomes of each action are summed, in the same order as
+          'calculate_cell_directions'
+    '''
+    model = self.level.get_transition_model()
+    next_values = discount_factor * np.asarray(values,dtype=float).reshape(-1)[model.next_states]
+
+    action_values = np.zeros((model.num_states,model.num_actions))
+    with np.errstate(invalid='ignore'):
+      for outcome in range(model.num_actions):
+        probability = model.probabilities[:,:,outcome]
+        outcome_value = probability * (model.rewards[:,:,outcome] + next_values[:,None,outcome])
+        action_values += np.where(probability > 0, outcome_value, 0)
+    return action_values.reshape(self.level.height,self.level.width,model.num_actions)
+
+
   def get_greedy_direction( self, arr ):
     ''' return the direction(s) with the maximum action value '''
     directions = 0
@@ -104,7 +154,7 @@ class Policy():
     return directions 
 
 
-  def calculate_cell_directions(self,x,y,values):
+  def calculate_cell_directions(self,x,y,values,discount_factor=1.0):
     ''' select the action with the highest value
         = argmax[ sum(p(s',r|s,a)[r + γV(s')]) ]
     '''
@@ -120,7 +170,7 @@ class Policy():
       action_value = 0
       for probability,next_state,reward in action_probabilities:
         # convert the x,y position into row,col
-        action_value += probability * (reward + values[next_state[1],next_state[0]])
+        action_value += probability * (reward + discount_factor * values[next_state[1],next_state[0]])
 
       dir_value = Direction.from_action(action)
 
@@ -183,7 +233,21 @@ class Policy():
       return self.level.action_space.sample()
 
     # choose one of the policies possible actions
-    return np.random.choice(actions)
+    return self.np_random.choice(actions)
+
+
+  def get_action_probability_array(self) -> np.ndarray:
+    ''' return a (height,width,5) array of the probability of taking each action in every state,
+        in the order of the 'Actions' enum
+        - this gives the same probabilities as 'get_action_probabilities' for every state
+    '''
+    # combine the directions allowed by the grid with those specified by the policy
+    directions = self.level.level.get_cached_directions() & np.asarray(self.directions,dtype=int)
+
+    action_directions = np.array([Direction.from_action(action) for action in Actions])
+    allowed = (directions[:,:,None] & action_directions[None,None,:]) > 0
+    num_actions = allowed.sum(axis=2,keepdims=True)
+    return np.where(allowed, 1 / np.maximum(num_actions,1), 0.0)
 
 
   def get_action_probabilities(self,x,y):
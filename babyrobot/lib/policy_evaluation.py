@@ -1,10 +1,13 @@
 # Copyright (c) Steve Roberts
 # Distributed under the terms of the Modified BSD License.
 
+import warnings
 import numpy as np
 from ..envs import BabyRobotInterface
 from ..envs.lib.direction import Direction
 from . import Policy
+from .backup_solver import BackupSolver
+from .convergence import ConvergenceHistory
 
 
 ''' evaluate a policy '''
@@ -15,7 +18,26 @@ class PolicyEvaluation():
   discount_factor = 1.0  
   threshold = 1e-3
 
-  def __init__(self, env: BabyRobotInterface, policy: Policy, discount_factor=1.0):
+  # the method used by 'run_to_convergence' to calculate the state values:
+  # - 'sweep': repeated sweeps through all states until the values stop changing
+  # - 'gauss_seidel': in-place sweeps, ordered by distance from the exit (see 'BackupSolver')
+  # - 'prioritized': in-place backups, in order of the largest change in value (see 'BackupSolver')
+  # - 'linear': solve the Bellman equations of the policy directly (requires scipy)
+  solver = 'sweep'
+
+  # the number of state backups performed by the 'sweep', 'gauss_seidel' and 'prioritized' solvers
+  backups = 0
+
+  # the history of the last call to 'run_to_convergence'
+  convergence = None
+
+  # the 'linear' solver uses an iterative Krylov method, rather than a direct
+  # solve, when the number of states is greater than this
+  direct_solve_limit = 250000
+  krylov_tolerance = 1e-10
+  krylov_max_iterations = 1000
+
+  def __init__(self, env: BabyRobotInterface, policy: Policy, discount_factor=1.0, solver='sweep'):
     self.env = env
 
     # check that a policy has been given to evaluate
@@ -23,11 +45,13 @@ class PolicyEvaluation():
 
     self.policy = policy
     self.discount_factor = discount_factor
+    self.solver = solver
     self.reset()
 
 
   def reset(self):
     self.iterations = 0
+    self.backups = 0
     self.reset_start_values()
     self.reset_end_values()
 
@@ -123,6 +147,7 @@ class PolicyEvaluation():
       for x in range(self.env.width):
         if self.env.level.grid_base.test_for_base_area(x,y) == False:
           if (x != end[0]) or (y != end[1]):          
+            self.backups += 1
             if self.policy is None:
               # use stochastic policy
               self.end_values[y,x] = self.calculate_state_value(x,y)   
@@ -138,20 +163,230 @@ class PolicyEvaluation():
     self.iterations += 1                  # increment the iteration count
 
 
-  def run_to_convergence(self, max_iterations = 100, threshold = 1e-3):
-    ''' run until the values stop changing '''
+  def get_policy_outcomes(self):
+    ''' combine the outcomes of the actions taken by the policy in every state
+
+        returns:
+        - a (num_states,num_outcomes) array of the probability of each outcome when following the policy
+        - a (num_states,num_outcomes) array of the next state of each outcome
+        - r_pi: the expected reward for a single step from each state
+        - a boolean array marking the states whose value is always zero. These are the exit, any
+          off-grid (base area) states and any states where the policy has no actions, and are
+          treated as absorbing (all their outcome probabilities are zero)
+    '''
+    env = self.env
+    model = env.get_transition_model()
+    num_states = model.num_states
+
+    # the probability of taking each action in every state
+    if self.policy is None:
+      # all available actions are equally likely
+      directions = env.level.get_cached_directions()
+      allowed = (directions.reshape(num_states,1) & model.action_directions[None,:]) > 0
+      action_probabilities = np.where(allowed, 1 / np.maximum(allowed.sum(axis=1,keepdims=True),1), 0.0)
+    else:
+      action_probabilities = self.policy.get_action_probability_array().reshape(num_states,-1)
+
+    absorbing = (action_probabilities.sum(axis=1) == 0)
+    absorbing[(env.end[1] * env.width) + env.end[0]] = True
+    absorbing |= env.level.grid_base.get_base_area_mask().reshape(-1)
+    action_probabilities = np.where(absorbing[:,None], 0.0, action_probabilities)
+
+    # combine the outcomes of each action, weighted by the probability of taking the action
+    outcome_probabilities = np.einsum('sa,sak->sk', action_probabilities, model.probabilities)
+    rewards = np.einsum('sa,sak->s', action_probabilities, model.probabilities * model.rewards)
+    return outcome_probabilities, model.next_states, rewards, absorbing
+
+
+  def get_policy_model(self):
+    ''' build the transition matrix and expected rewards of the policy
+
+        returns:
+        - P_pi: a sparse (num_states,num_states) matrix of the probability of moving from each state
+          to every other state when following the policy
+        - r_pi: the expected reward for a single step from each state
+        - a boolean array marking the absorbing states, whose rows of P_pi are empty
+          (see 'get_policy_outcomes')
+    '''
+    from scipy import sparse
+
+    outcome_probabilities, next_states, rewards, absorbing = self.get_policy_outcomes()
+    num_states = len(rewards)
+    rows = np.repeat(np.arange(num_states), next_states.shape[1])
+    transitions = sparse.csr_matrix((outcome_probabilities.reshape(-1), (rows, next_states.reshape(-1))),
+                                    shape=(num_states,num_states))
+    transitions.eliminate_zeros()
+    return transitions, rewards, absorbing
+
+
+  def get_terminating_states(self, transitions, absorbing) -> np.ndarray:
+    ''' return a boolean array of the states that are certain to reach an absorbing state
+        - without discounting, only these states have a finite value
+    '''
+    from scipy import sparse
+    from scipy.sparse import csgraph
+
+    def can_reach(targets):
+      # find the states that can reach any of the targets by searching backwards from
+      # an extra node that leads to all of them
+      num_states = transitions.shape[0]
+      to_targets = sparse.csr_matrix((np.ones(np.count_nonzero(targets)), (np.zeros(np.count_nonzero(targets),dtype=int), np.flatnonzero(targets))),
+                                     shape=(1,num_states))
+      graph = sparse.bmat([[transitions.T, None],[to_targets, None]], format='csr')
+      graph = sparse.hstack([graph, sparse.csr_matrix((num_states+1,1))], format='csr')
+      order = csgraph.breadth_first_order(graph, num_states, directed=True, return_predecessors=False)
+      reached = np.zeros(num_states+1,dtype=bool)
+      reached[order] = True
+      return reached[:num_states]
+
+    # states that can never reach an absorbing state are trapped, as are all states that can reach them
+    trapped = ~can_reach(absorbing)
+    if not trapped.any():
+      return np.ones(len(absorbing),dtype=bool)
+    return ~can_reach(trapped)
+
+
+  def solve_linear_system(self):
+    ''' calculate the exact state values of the policy in a single step, by solving
+        the Bellman equations of the policy: (I - γP_pi)v = r_pi
+
+        - the exit is absorbing, with a value of zero
+        - without discounting, states that aren't certain to reach the exit have no finite value
+          and are set to NaN
+        - large levels are solved with an iterative Krylov method (BiCGSTAB, preconditioned with
+          an incomplete LU factorization), starting from the current values, rather than a direct
+          sparse solve. A warning is given if this doesn't converge
+
+        returns the number of solver iterations (1 for a direct solve)
+    '''
+    try:
+      from scipy import sparse
+      from scipy.sparse import linalg
+    except ImportError:
+      raise ImportError("The 'linear' solver requires scipy, which can be installed with: pip install scipy") from None
+
+    transitions, rewards, absorbing = self.get_policy_model()
+
+    # only solve for the states that have a finite, non-zero, value
+    solve = ~absorbing
+    if self.discount_factor >= 1.0:
+      solve &= self.get_terminating_states(transitions, absorbing)
+    states = np.flatnonzero(solve)
+
+    values = np.zeros(len(rewards))
+    values[~absorbing & ~solve] = np.nan
+
+    iterations = 1
+    if len(states) > 0:
+      system = sparse.identity(len(states), format='csr') - (self.discount_factor * transitions[states][:,states])
+      if len(states) <= self.direct_solve_limit:
+        values[states] = linalg.spsolve(system.tocsc(), rewards[states])
+      else:
+        iteration_count = [0]
+        def count_iteration(xk): iteration_count[0] += 1
+
+        # without preconditioning, the system for a long maze is too badly conditioned to converge
+        system = system.tocsc()
+        factors = linalg.spilu(system, drop_tol=1e-5, fill_factor=10)
+        preconditioner = linalg.LinearOperator(system.shape, factors.solve)
+
+        initial_values = np.nan_to_num(self.end_values.reshape(-1)[states])
+        values[states], info = linalg.bicgstab(system, rewards[states], x0=initial_values, M=preconditioner,
+                                               rtol=self.krylov_tolerance, atol=0.0,
+                                               maxiter=self.krylov_max_iterations, callback=count_iteration)
+        iterations = iteration_count[0]
+        if info != 0:
+          warnings.warn(f"The Krylov solver didn't converge after {iterations} iterations, so the state values are approximate.")
+
+    # the values are exact, so the start and end values are the same
+    self.end_values = values.reshape(self.env.height,self.env.width)
+    self.start_values = self.end_values.copy()
+    self.iterations += 1
+    return iterations
+
+
+  def get_backup_solver(self) -> BackupSolver:
+    ''' create the in-place solver for the Bellman equations of the policy:
+        v(s) = r_pi(s) + γ Σ P_pi(s,s') v(s')
+    '''
+    outcome_probabilities, next_states, rewards, absorbing = self.get_policy_outcomes()
+    return BackupSolver( rewards[:,None],
+                         next_states[:,None,:],
+                         self.discount_factor * outcome_probabilities[:,None,:],
+                         ~absorbing[:,None],
+                         absorbing )
+
+
+  def run_backup_solver(self, max_iterations = 100, threshold = 1e-3, history: ConvergenceHistory = None):
+    ''' calculate the state values with the in-place 'gauss_seidel' or 'prioritized' solver,
+        starting from the current values
+        - as with the 'linear' solver, states with no finite value are set to NaN
+        - if a history is supplied the progress of each sweep is added to it
+
+        returns the number of sweeps (for prioritized sweeping, the number of backups
+        as a whole number of sweeps through the states)
+    '''
+    backup_solver = self.get_backup_solver()
+    values = self.end_values.reshape(-1).tolist()
+
+    # without discounting, states that aren't certain to reach the exit have no finite value
+    if self.discount_factor >= 1.0:
+      trapped = [state for state, terminates in enumerate(backup_solver.get_terminating_states()) if not terminates]
+      backup_solver.fix_states( trapped )
+      for state in trapped:
+        values[state] = np.nan
+
+    on_sweep = None if history is None else history.record
+    if self.solver == 'gauss_seidel':
+      end_state = (self.env.end[1] * self.env.width) + self.env.end[0]
+      order = backup_solver.get_distance_order( end_state )
+      iterations, start_values = backup_solver.gauss_seidel( values, order, max_iterations, threshold, on_sweep )
+    else:
+      num_states = backup_solver.num_states
+      backups = backup_solver.prioritized_sweeping( values, max_iterations * num_states, threshold, on_sweep )
+      iterations = -(-backups // num_states)
+      start_values = values
+
+    self.start_values = np.array(start_values).reshape(self.env.height,self.env.width)
+    self.end_values = np.array(values).reshape(self.env.height,self.env.width)
+    self.iterations += iterations
+    self.backups += backup_solver.backups
+    return iterations
+
+
+  def run_to_convergence(self, max_iterations = 100, threshold = 1e-3, callback = None):
+    ''' run until the values stop changing
+        - the change in value, number of backups and time of each sweep are recorded in a
+          'ConvergenceHistory', stored as 'convergence'
+        - if supplied, 'callback' is called with this history after each sweep and can
+          stop the run by returning True
+        - the 'linear' solver is recorded as a single exact iteration and returns the
+          number of solver iterations (see 'solve_linear_system')
+    '''
+    history = ConvergenceHistory( self.solver, threshold, callback )
+    self.convergence = history
+
+    if self.solver == 'linear':
+      iterations = self.solve_linear_system()
+      history.record( 0.0, 0 )
+      return iterations
+    if self.solver in ('gauss_seidel','prioritized'):
+      self.run_backup_solver( max_iterations, threshold, history )
+      return history.iterations
+
     for n in range(max_iterations):
+      backups = self.backups
       self.do_iteration()
       
       # calculate the largest difference in the state values from the start to end of the iteration
       delta = np.max(np.abs(self.end_values - self.start_values))            
       
       # test if the difference is less than the defined convergence threshold
-      if delta < threshold:
+      if history.record( delta, self.backups - backups ):
         break
     
     # return the number of iterations taken to converge
-    return n
+    return history.iterations
 
 
   def set_policy(self, policy: Policy):
@@ -0,0 +1,123 @@
+# Copyright (c) Steve Roberts
+# Distributed under the terms of the Modified BSD License.
+
+import time
+import numpy as np
+from ..envs import BabyRobotInterface
+from . import Policy
+from . import PolicyEvaluation
+
+
+class PolicyIteration():
+  '''
+    Modified policy iteration: alternate between evaluating the current policy and
+    acting greedily with respect to the resulting state values.
+
+    - each evaluation runs for at most 'evaluation_sweeps' sweeps (k) and starts from the
+      values of the previous evaluation, rather than from zero
+    - if 'evaluation_sweeps' is None each policy is evaluated to convergence, giving
+      standard policy iteration
+    - the run stops once the policy no longer changes and the state values have stopped changing
+    - where all the actions of the previous policy are still greedy they're kept, so ties
+      between equally good actions don't change the policy
+  '''
+
+  # the limit on the number of sweeps when evaluating each policy to convergence
+  max_evaluation_sweeps = 1000
+
+  def __init__(self, env: BabyRobotInterface, policy: Policy = None, discount_factor=1.0,
+               evaluation_sweeps=None, solver='sweep', threshold=1e-3):
+    self.env = env
+    self.policy = Policy(env) if policy is None else policy
+    self.evaluation_sweeps = evaluation_sweeps
+    self.threshold = threshold
+
+    # the policy evaluation is kept between iterations, so each evaluation is warm-started
+    self.policy_evaluation = PolicyEvaluation(env, self.policy, discount_factor, solver=solver)
+    self.reset()
+
+
+  def reset(self):
+    ''' reset the state values and the run statistics '''
+    self.policy_evaluation.reset()
+    self.iterations = 0
+    self.sweeps = 0
+    self.time = 0.0
+    self.stable = False
+
+
+  @property
+  def values(self):
+    return self.policy_evaluation.end_values
+
+
+  @property
+  def backups(self):
+    return self.policy_evaluation.backups
+
+
+  def do_iteration(self):
+    ''' evaluate the current policy and then improve it
+
+        returns True if the policy is stable
+    '''
+    start_time = time.perf_counter()
+
+    # partially evaluate the policy, starting from the current state values
+    max_sweeps = self.max_evaluation_sweeps if self.evaluation_sweeps is None else self.evaluation_sweeps
+    iterations = self.policy_evaluation.iterations
+    self.policy_evaluation.run_to_convergence( max_sweeps, self.threshold )
+    self.sweeps += self.policy_evaluation.iterations - iterations
+
+    # the change in the state values during the last sweep of the evaluation
+    # (states with no finite value are ignored)
+    delta = np.max(np.abs(np.nan_to_num(self.policy_evaluation.end_values - self.policy_evaluation.start_values)))
+
+    # act greedily with respect to the new values
+    previous_directions = np.array(self.policy.directions, copy=True)
+    self.improve_policy()
+    policy_stable = np.array_equal(previous_directions, self.policy.directions)
+
+    self.stable = policy_stable and (delta < self.threshold)
+    self.iterations += 1
+    self.time += time.perf_counter() - start_time
+    return self.stable
+
+
+  def improve_policy(self):
+    ''' act greedily with respect to the current state values
+        - where the directions of the previous policy are all greedy they are kept, so that a
+          policy choosing between equally good actions is stable
+    '''
+    previous_directions = np.asarray(self.policy.directions, dtype=int)
+    greedy_directions = self.policy.calculate_greedy_directions( self.policy_evaluation.end_values,
+                                                                 self.policy_evaluation.discount_factor )
+    keep = (previous_directions != 0) & ((previous_directions & ~greedy_directions) == 0)
+    self.policy.set_policy( np.where(keep, previous_directions, greedy_directions) )
+    return self.policy.directions
+
+
+  def run(self, max_iterations = 100):
+    ''' run policy iteration until the policy is stable or the maximum number of iterations is reached
+
+        returns a dictionary of the run statistics (see 'get_statistics')
+    '''
+    for n in range(max_iterations):
+      if self.do_iteration():
+        break
+    return self.get_statistics()
+
+
+  def get_statistics(self) -> dict:
+    ''' return the statistics of the run so far:
+        - 'iterations': the number of policy evaluation and improvement steps
+        - 'sweeps': the total number of evaluation sweeps through the states
+        - 'backups': the total number of state backups (zero for the 'linear' solver)
+        - 'time': the total wall time, in seconds
+        - 'stable': True if the policy has stopped changing
+    '''
+    return {'iterations': self.iterations,
+            'sweeps': self.sweeps,
+            'backups': self.backups,
+            'time': self.time,
+            'stable': self.stable}
@@ -0,0 +1,188 @@
+# Copyright (c) Steve Roberts
+# Distributed under the terms of the Modified BSD License.
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+import zipfile
+import numpy as np
+
+from .._version import __version__
+from .utils import make
+from .policy import Policy
+from .policy_evaluation import PolicyEvaluation
+from .value_iteration import ValueIteration
+
+
+class SolutionCache():
+  '''
+    An on-disk cache of the state values calculated by 'ValueIteration' or 'PolicyEvaluation'.
+
+    - each solution is held in its own '.npz' file, named by a hash of the level setup
+      (as supplied to 'make'), the method and the solver parameters
+    - a solution holds the state values, the greedy directions of the values and the
+      convergence statistics of the run that calculated them
+    - when the total size of the cache goes over 'max_size' bytes the least recently used
+      solutions are removed
+    - the cache directory can be shared by multiple processes: files are written to a temporary
+      file and then renamed into place, so a solution is never seen partly written, and a
+      solution that can't be read (for example because another process has just removed it)
+      is treated as not being in the cache
+  '''
+
+  # the methods used to calculate the state values
+  methods = ('value_iteration','policy_evaluation')
+
+  def __init__(self, cache_dir: str, max_size: int = 256 * 2**20):
+    self.cache_dir = cache_dir
+    self.max_size = max_size
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # the number of solutions found in, and missing from, the cache by this object
+    self.hits = 0
+    self.misses = 0
+
+
+  @staticmethod
+  def get_key( setup: dict, method: str, parameters: dict ) -> str:
+    ''' return the hash that identifies a solution
+        - the setup and parameters are written as JSON with sorted keys, so the order in which
+          they're given doesn't matter, and tuples and arrays are written as lists
+    '''
+    def to_list( value ):
+      if hasattr(value,'tolist'):
+        return value.tolist()
+      raise TypeError(f"Can't use a value of type {type(value).__name__} in a cache key")
+
+    description = {'version': __version__, 'setup': setup, 'method': method, 'parameters': parameters}
+    text = json.dumps(description, sort_keys=True, default=to_list)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+  def get_filename(self, key: str) -> str:
+    return os.path.join(self.cache_dir, f'{key}.npz')
+
+
+  def load(self, key: str) -> dict:
+    ''' return the solution with the given key, or None if it isn't in the cache
+        - loading a solution marks it as recently used
+    '''
+    filename = self.get_filename(key)
+    try:
+      with np.load(filename, allow_pickle=False) as data:
+        solution = {name: data[name] for name in data.files}
+      os.utime(filename)
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+      # missing, or removed by another process after being found
+      return None
+
+    # convert the run statistics back to plain values
+    for name in ('iterations','converged','solve_time'):
+      solution[name] = solution[name].item()
+    return solution
+
+
+  def save(self, key: str, solution: dict):
+    ''' write a solution to the cache and then remove any old solutions to keep the cache within its size '''
+    handle, temp_filename = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+    try:
+      with os.fdopen(handle, 'wb') as temp_file:
+        np.savez(temp_file, **solution)
+      os.replace(temp_filename, self.get_filename(key))
+    except BaseException:
+      if os.path.exists(temp_filename):
+        os.remove(temp_filename)
+      raise
+    self.evict()
+
+
+  def evict(self):
+    ''' remove the least recently used solutions until the cache is no larger than 'max_size' '''
+    entries = []
+    for entry in os.scandir(self.cache_dir):
+      if entry.name.endswith('.npz'):
+        try:
+          stat = entry.stat()
+          entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError:
+          pass
+
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+      if total_size <= self.max_size:
+        break
+      try:
+        os.remove(path)
+      except OSError:
+        # already removed by another process
+        pass
+      total_size -= size
+
+
+  def clear(self):
+    ''' remove all of the solutions from the cache '''
+    for entry in os.scandir(self.cache_dir):
+      if entry.name.endswith('.npz'):
+        try:
+          os.remove(entry.path)
+        except OSError:
+          pass
+
+
+  def solve(self, setup: dict, method: str = 'value_iteration', discount_factor = 0.9, solver = 'sweep',
+            max_iterations = 1000, threshold = 1e-3, directions: np.ndarray = None) -> dict:
+    ''' return the solution for the level, loading it from the cache if it has already been calculated
+
+        - 'method' is either 'value_iteration' or 'policy_evaluation'
+        - for policy evaluation, 'directions' is the direction bitfield of the policy to evaluate.
+          If this isn't given all actions are equally likely.
+
+        returns a dictionary holding:
+        - 'values': the (height,width) array of state values
+        - 'policy': the (height,width) direction bitfield of the greedy policy for the values
+        - 'iterations': the number of iterations of the solver
+        - 'converged': True if the values converged within the maximum number of iterations
+        - 'deltas': the largest change in value during each iteration
+        - 'solve_time': the time taken to calculate the values, in seconds
+    '''
+    if method not in self.methods:
+      raise Exception(f"Unknown solution method '{method}'")
+
+    parameters = {'discount_factor': discount_factor, 'solver': solver,
+                  'max_iterations': max_iterations, 'threshold': threshold}
+    if method == 'policy_evaluation':
+      parameters['directions'] = None if directions is None else np.asarray(directions,dtype=int)
+
+    key = self.get_key(setup, method, parameters)
+    solution = self.load(key)
+    if solution is not None:
+      self.hits += 1
+      return solution
+    self.misses += 1
+
+    level = make("BabyRobot-v0", render_mode=None, **setup).unwrapped
+
+    start_time = time.perf_counter()
+    if method == 'value_iteration':
+      value_iteration = ValueIteration( level, discount_factor, solver=solver )
+      value_iteration.run_to_convergence( max_iterations, threshold )
+      values = value_iteration.values
+      convergence = value_iteration.convergence
+    else:
+      policy = Policy( level, None if directions is None else np.array(directions, copy=True) )
+      policy_evaluation = PolicyEvaluation( level, policy, discount_factor, solver=solver )
+      policy_evaluation.run_to_convergence( max_iterations, threshold )
+      values = policy_evaluation.end_values
+      convergence = policy_evaluation.convergence
+    solve_time = time.perf_counter() - start_time
+
+    solution = {'values': values,
+                'policy': Policy( level ).calculate_greedy_directions( values, discount_factor ),
+                'iterations': convergence.iterations,
+                'converged': convergence.converged,
+                'deltas': np.array(convergence.deltas, dtype=float),
+                'solve_time': solve_time}
+    self.save(key, solution)
+    return solution
@@ -0,0 +1,171 @@
+# Copyright (c) Steve Roberts
+# Distributed under the terms of the Modified BSD License.
+
+from bisect import bisect_right
+import numpy as np
+from ..envs import BabyRobotInterface
+from ..envs.lib.direction import Direction
+from ..envs.lib.actions import Actions
+from .policy import Policy
+
+
+class TabularPolicy(Policy):
+  '''
+    A policy held as a (height,width,5) table of the probability of taking each action in
+    every state, in the order of the 'Actions' enum.
+
+    - the table can be created from a direction bitfield, as used by 'Policy', in which case
+      all of the directions in a state are equally likely, or from an array of probabilities
+    - actions that aren't possible in a state, and all actions in the exit, are given zero
+      probability and the remaining probabilities of each state are normalised to sum to one
+    - the 'directions' bitfield is kept in step with the table, so setting it (for example in
+      'update_policy') rebuilds the table
+    - the cumulative probabilities of each state are precomputed, so choosing an action only
+      needs a single uniform random number and a search of five values
+  '''
+
+  # the number of uniform random numbers drawn from the generator at a time
+  random_block_size = 4096
+
+  # the order of the actions returned by 'get_actions' (the same order as 'Policy')
+  action_order = [Actions.North, Actions.South, Actions.East, Actions.West]
+
+  def __init__(self, level: BabyRobotInterface, directions: np.array = None, probabilities: np.array = None, seed = None):
+    super().__init__( level, directions, seed )
+
+    # the base class removes the directions of the exit in place, so the table is built afterwards
+    if probabilities is None:
+      self.set_policy( self._directions )
+    else:
+      self.set_probabilities( probabilities )
+
+
+  @classmethod
+  def from_policy(cls, policy: Policy, seed = None):
+    ''' create a tabular policy with the same action probabilities as the supplied policy '''
+    return cls( policy.level, probabilities=policy.get_action_probability_array(), seed=seed )
+
+
+  def seed(self, seed = None):
+    ''' create the policy's own random number generator, from the supplied seed '''
+    super().seed(seed)
+    self.uniforms = []
+    self.uniform_index = 0
+
+
+  @property
+  def directions(self):
+    ''' the direction bitfield of every state '''
+    return self._directions
+
+  @directions.setter
+  def directions(self, directions):
+    # when called from the base class constructor the table is built once the exit is cleared
+    if hasattr(self, 'probabilities'):
+      self.set_policy( directions )
+    else:
+      self._directions = np.asarray(directions)
+
+
+  def set_policy(self, directions):
+    ''' set the policy from a direction bitfield, with all directions in a state equally likely '''
+    self._directions = np.asarray(directions)
+    self.set_table( self.get_direction_probabilities( self._directions ) )
+
+
+  def set_probabilities(self, probabilities: np.ndarray):
+    ''' set the policy from a (height,width,5) array of action probabilities
+        - invalid actions are removed and the probabilities of each state normalised to sum to one
+    '''
+    probabilities = np.where(self.get_valid_actions(), np.asarray(probabilities,dtype=float), 0.0)
+    totals = probabilities.sum(axis=2,keepdims=True)
+    probabilities = np.divide(probabilities, totals, out=np.zeros_like(probabilities), where=totals > 0)
+    self.set_table( probabilities )
+
+
+  def get_valid_actions(self) -> np.ndarray:
+    ''' return a (height,width,5) boolean array of the actions possible in each state
+        - this is recalculated if the layout of the level changes
+    '''
+    layout_version = self.level.level.grid_base.layout_version
+    if getattr(self,'valid_version',None) != layout_version:
+      action_directions = np.array([Direction.from_action(action) for action in Actions])
+      self.valid = (self.level.level.get_cached_directions()[:,:,None] & action_directions) > 0
+      self.valid[self.level.end[1],self.level.end[0]] = False
+      self.valid_version = layout_version
+    return self.valid
+
+
+  def get_direction_probabilities(self, directions: np.ndarray) -> np.ndarray:
+    ''' convert a direction bitfield into a table where the valid directions of each state are equally likely '''
+    action_directions = np.array([Direction.from_action(action) for action in Actions])
+    allowed = self.get_valid_actions() & ((np.asarray(directions,dtype=int)[:,:,None] & action_directions) > 0)
+    num_actions = allowed.sum(axis=2,keepdims=True)
+    return np.where(allowed, 1 / np.maximum(num_actions,1), 0.0)
+
+
+  def set_table(self, probabilities: np.ndarray):
+    ''' store the probability table and precompute the values used to choose and list the actions '''
+    self.probabilities = probabilities
+
+    # the direction bitfield of the actions with a non-zero probability
+    action_directions = np.array([Direction.from_action(action) for action in Actions])
+    self._directions = np.sum(np.where(probabilities > 0, action_directions, 0), axis=2)
+
+    # the cumulative probabilities of each state, normalised so each row ends at exactly 1
+    num_states = self.level.height * self.level.width
+    cumulative = np.cumsum(probabilities.reshape(num_states,-1), axis=1)
+    cumulative = np.divide(cumulative, cumulative[:,-1:], out=np.zeros_like(cumulative), where=cumulative[:,-1:] > 0)
+    self.cumulative = cumulative.tolist()
+
+    # the actions, and their probabilities, in each state
+    self.state_probabilities = []
+    for state_probabilities in probabilities.reshape(num_states,-1).tolist():
+      self.state_probabilities.append({ action:state_probabilities[action]
+                                        for action in self.action_order if state_probabilities[action] > 0 })
+
+
+  def get_action_probability_array(self) -> np.ndarray:
+    ''' return the (height,width,5) array of the probability of taking each action in every state
+        - this is the policy's own table and shouldn't be modified
+    '''
+    return self.probabilities
+
+
+  def get_action_probabilities(self,x,y):
+    ''' return a dictionary with the allowed actions for a state along with the
+        probability of taking each of these actions
+        - this is shared by all callers and shouldn't be modified
+    '''
+    return self.state_probabilities[(y * self.level.width) + x]
+
+
+  def get_state_directions(self,x,y):
+    ''' return the direction bitfield for the specified state
+      - invalid directions have already been removed from the table
+    '''
+    return int(self._directions[y,x])
+
+
+  def get_actions(self,x,y):
+    ''' return a list of the actions with a non-zero probability in the specified state '''
+    return list(self.state_probabilities[(y * self.level.width) + x])
+
+
+  def get_action(self,x,y):
+    ''' return a single action for the specified state, chosen with the probabilities of the table
+        - if no action exists for this state then one will be chosen at random from the
+        available directions
+    '''
+    state = (y * self.level.width) + x
+    if not self.state_probabilities[state]:
+      # choose a random action (stochastic policy with all actions possible)
+      return self.level.action_space.sample()
+
+    if self.uniform_index == len(self.uniforms):
+      self.uniforms = self.np_random.random(self.random_block_size).tolist()
+      self.uniform_index = 0
+    u = self.uniforms[self.uniform_index]
+    self.uniform_index += 1
+
+    return Actions(bisect_right(self.cumulative[state], u))
@@ -7,6 +7,7 @@ from ipywidgets import Play, IntProgress, HBox, VBox, link
 import imageio
 import os
 import gymnasium
+from gymnasium.envs.registration import load
 
 
 class Utils():
@@ -77,10 +78,19 @@ def make( id: str, render_mode='human', **setup: dict ):
       The 'apply_api_compatibility=False' parameter is required to stop a warning appearing:
       "Initializing wrapper in old step API"
 
+    * Environments without any render modes, such as 'BabyRobotVector-v0', are created
+      headless when the default render mode is used.
+
     * id: The string used to create the environment with `gym.make`
   '''
 
   # by default run Baby Robot in Jupyter Notebook graphical mode
+  # - environments that don't have any render modes (such as the vector environment) are
+  #   created without a render mode, rather than failing on the default mode
+  spec = gymnasium.spec(id)
+  render_modes = load(spec.entry_point).metadata.get('render_modes') if isinstance(spec.entry_point,str) else None
+  if render_modes == [] and render_mode == 'human':
+    render_mode = None
   setup['render_mode'] = render_mode
 
   # if 'max_episode_steps' is set the '_disable_render_order_enforcing' value is not
@@ -7,15 +7,37 @@ from numpy import inf
 
 from ..envs import BabyRobotInterface
 from ..envs.lib.direction import Direction
+from ..envs.lib.actions import Actions
+from .backup_solver import BackupSolver
+from .convergence import ConvergenceHistory
 
 
 class ValueIteration():
 
-  def __init__(self, env: BabyRobotInterface, discount_factor=0.9):
+  # the order in which 'get_available_actions' returns the actions of a state
+  action_order = [Actions.North, Actions.South, Actions.East, Actions.West]
+
+  def __init__(self, env: BabyRobotInterface, discount_factor=0.9, vectorized=True, solver='sweep'):
     self.level = env
     self.values = np.zeros((env.height,env.width))
     self.discount_factor = discount_factor
 
+    # if set, calculate the values of all states at once from precomputed arrays of the
+    # transition probabilities and rewards, rather than one state at a time
+    self.vectorized = vectorized
+    self.backup = None
+    self.backup_version = None
+
+    # the method used by 'run_to_convergence' to calculate the state values:
+    # - 'sweep': repeated sweeps through all states, each using the values from the previous sweep
+    # - 'gauss_seidel': in-place sweeps, ordered by distance from the exit (see 'BackupSolver')
+    # - 'prioritized': in-place backups, in order of the largest change in value (see 'BackupSolver')
+    self.solver = solver
+    self.backups = 0
+
+    # the history of the last call to 'run_to_convergence'
+    self.convergence = None
+
 
   def get_state_value(self,pos):
     ''' get the currently calculated value of the specified position in the grid '''
@@ -87,15 +109,138 @@ class ValueIteration():
     return max_value
 
 
+  def get_backup(self) -> dict:
+    ''' return the arrays used to calculate the values of all states at once
+        - these are calculated when first required and whenever the layout of the level changes
+    '''
+    layout_version = self.level.level.grid_base.layout_version
+    if (self.backup is None) or (self.backup_version != layout_version):
+      self.backup = self.compile_backup()
+      self.backup_version = layout_version
+    return self.backup
+
+
+  def compile_backup(self) -> dict:
+    ''' calculate the arrays used by the vectorized state sweep
+
+        For every state, and each action in the order given by 'action_order', these hold:
+        - 'available': true if the action can be taken in the state
+        - 'next_states': the state that the action moves to
+        - 'on_grid': true if the next state is on the grid (off-grid states have zero value)
+        - 'next_rewards': the reward for moving to the next state
+        - 'probabilities': for each chosen action, the probability of moving in the direction of each action
+        - 'stay': true where the chosen action is the only one, so it remains in the same state if it fails
+        - 'stay_probabilities': the probability of remaining in the same state
+
+        These follow 'calculate_max_action_value' exactly: a failed action either slips to one of
+        the other available actions or, if it ran into a barrier, bounces in the opposite direction.
+    '''
+    env = self.level
+    width = env.width
+    num_states = env.width * env.height
+    num_actions = len(self.action_order)
+    order = [int(action) for action in self.action_order]
+
+    directions = env.level.get_cached_directions().reshape(-1)
+    rewards = np.asarray(env.level.get_rewards(),dtype=float).reshape(-1)
+    transition_probabilities, barriers = env.level.grid_base.get_transition_probabilities()
+    transition_probabilities = transition_probabilities.reshape(num_states,-1)[:,order]
+    barriers = barriers.reshape(num_states,-1)[:,order]
+
+    action_directions = np.array([Direction.from_action(action) for action in self.action_order])
+    available = (directions[:,None] & action_directions[None,:]) > 0
+    num_alternative_states = available.sum(axis=1) - 1
+
+    # the position of the next state when moving in the direction of each action
+    states = np.arange(num_states)
+    dx = np.array([0,0,1,-1])
+    dy = np.array([-1,1,0,0])
+    next_x = (states % width)[:,None] + dx[None,:]
+    next_y = (states // width)[:,None] + dy[None,:]
+    on_grid = (next_x >= 0) & (next_x < env.width) & (next_y >= 0) & (next_y < env.height)
+    next_states = np.where(on_grid, next_y * width + next_x, states[:,None])
+
+    # the probability of moving in the direction of each action, given the chosen action
+    opposites = [self.action_order.index(Direction.to_action(Direction.get_opposite(Direction.from_action(action))))
+                 for action in self.action_order]
+    slip_probabilities = (1 - transition_probabilities) / np.maximum(num_alternative_states,1)[:,None]
+    probabilities = np.zeros((num_states,num_actions,num_actions))
+    for chosen in range(num_actions):
+      for index in range(num_actions):
+        if index == chosen:
+          probabilities[:,chosen,index] = transition_probabilities[:,chosen]
+        else:
+          bounce = (1 - transition_probabilities[:,chosen]) if index == opposites[chosen] else 0
+          probabilities[:,chosen,index] = np.where(barriers[:,chosen], bounce, slip_probabilities[:,chosen])
+
+    return {'available': available,
+            'next_states': next_states,
+            'on_grid': on_grid,
+            'rewards': rewards,
+            'next_rewards': rewards[next_states],
+            'probabilities': probabilities,
+            'stay': available & (num_alternative_states[:,None] == 0) & (transition_probabilities < 1.0),
+            'stay_probabilities': 1 - transition_probabilities}
+
+
+  def calculate_max_action_values(self) -> np.ndarray:
+    ''' calculate the largest action value of every state at once
+        - this gives the same values as calling 'calculate_max_action_value' for each state,
+          with the terms summed in the same order
+    '''
+    max_values = self.get_max_action_values( self.get_backup(), self.values.reshape(-1), self.discount_factor )
+    return max_values.reshape(self.level.height,self.level.width)
+
+
+  @staticmethod
+  def get_max_action_values( backup: dict, values: np.ndarray, discount_factor: float, start = 0, stop = None ) -> np.ndarray:
+    ''' calculate the largest action value of the states from 'start' up to 'stop'
+        - 'backup' holds the arrays returned by 'compile_backup' and 'values' are the current
+          values of all states, as a flat array
+        - only the values of the neighbours of these states are read, so a band of grid rows
+          can be calculated from the band and the rows either side of it
+    '''
+    states = slice(start,stop)
+    available = backup['available'][states]
+    probabilities = backup['probabilities'][states]
+    num_states, num_actions = available.shape
+
+    # the discounted value of moving in the direction of each action from every state: r + γv(s')
+    next_values = np.where(backup['on_grid'][states], values[backup['next_states'][states]], 0)
+    next_action_values = backup['next_rewards'][states] + (discount_factor * next_values)
+
+    max_values = np.full(num_states, -inf)
+    for chosen in range(num_actions):
+
+      # sum the values of the possible next states
+      action_values = np.zeros(num_states)
+      for index in range(num_actions):
+        action_values += np.where(available[:,index], probabilities[:,chosen,index] * next_action_values[:,index], 0)
+
+      # add the value of remaining in the same state when the only action fails
+      stay_values = backup['stay_probabilities'][states,chosen] * (backup['rewards'][states] + (discount_factor * next_values[:,chosen]))
+      action_values += np.where(backup['stay'][states,chosen], stay_values, 0)
+
+      # save the largest value
+      larger = available[:,chosen] & (action_values > max_values)
+      max_values[larger] = action_values[larger]
+
+    return max_values
+
+
   def state_sweep(self):
     ''' calculate the value of all states except the exit '''
     
-    new_values = np.zeros((self.level.height,self.level.width))
     end = self.level.end
-    for y in range(self.level.height):
-      for x in range(self.level.width):
-        if (x != end[0]) or (y != end[1]):          
-          new_values[y,x] = self.calculate_max_action_value(x,y)    
+    if self.vectorized:
+      new_values = self.calculate_max_action_values()
+      new_values[end[1],end[0]] = 0
+    else:
+      new_values = np.zeros((self.level.height,self.level.width))
+      for y in range(self.level.height):
+        for x in range(self.level.width):
+          if (x != end[0]) or (y != end[1]):          
+            new_values[y,x] = self.calculate_max_action_value(x,y)    
 
     # calculate the largest difference in the state values between the start and end of the sweep    
     delta = np.max(np.abs(new_values - self.values))           
@@ -109,18 +254,98 @@ class ValueIteration():
     return delta
 
 
-  def run_to_convergence(self, max_iterations = 100, threshold = 1e-3):
+  def get_backup_solver(self) -> BackupSolver:
+    ''' create the in-place solver for the Bellman optimality equations of the level
+
+        Each action has the same outcomes as in 'calculate_max_action_values': a move in the
+        direction of each available action plus, if it's the only action, remaining in place.
+        The exit, and any states with no available actions, are fixed.
+    '''
+    backup = self.get_backup()
+    available = backup['available']
+    probabilities = backup['probabilities']
+    num_states, num_actions = available.shape
+    γ = self.discount_factor
+
+    # the probability of moving in the direction of each action, given the chosen action
+    moves = np.where(available[:,None,:], probabilities, 0)
+    stay_probabilities = np.where(backup['stay'], backup['stay_probabilities'], 0)
+
+    constants = np.einsum('sak,sk->sa', moves, backup['next_rewards']) + (stay_probabilities * backup['rewards'][:,None])
+
+    # the next state of each move, followed by the state moved to when the only action fails
+    next_states = np.concatenate((np.broadcast_to(backup['next_states'][:,None,:], moves.shape),
+                                  backup['next_states'][:,:,None]), axis=2)
+    coefficients = γ * np.concatenate((moves, stay_probabilities[:,:,None]), axis=2)
+    on_grid = np.concatenate((np.broadcast_to(backup['on_grid'][:,None,:], moves.shape),
+                              backup['on_grid'][:,:,None]), axis=2)
+    coefficients = np.where(on_grid, coefficients, 0)
+
+    end = self.level.end
+    fixed = ~available.any(axis=1)
+    fixed[(end[1] * self.level.width) + end[0]] = True
+    return BackupSolver( constants, next_states, coefficients, available, fixed )
+
+
+  def run_backup_solver(self, max_iterations = 100, threshold = 1e-3, history: ConvergenceHistory = None):
+    ''' calculate the state values with the in-place 'gauss_seidel' or 'prioritized' solver,
+        starting from the current values
+        - if a history is supplied the progress of each sweep is added to it
+
+        returns the number of sweeps (for prioritized sweeping, the number of backups
+        as a whole number of sweeps through the states)
+    '''
+    backup_solver = self.get_backup_solver()
+    end = self.level.end
+    end_state = (end[1] * self.level.width) + end[0]
+
+    # the exit has zero value and states where no value can be calculated are set to NaN
+    values = self.values.reshape(-1).copy()
+    values[~self.get_backup()['available'].any(axis=1)] = np.nan
+    values[end_state] = 0
+    values = values.tolist()
+
+    on_sweep = None if history is None else history.record
+    if self.solver == 'gauss_seidel':
+      order = backup_solver.get_distance_order( end_state )
+      iterations, _ = backup_solver.gauss_seidel( values, order, max_iterations, threshold, on_sweep )
+    else:
+      num_states = backup_solver.num_states
+      backups = backup_solver.prioritized_sweeping( values, max_iterations * num_states, threshold, on_sweep )
+      iterations = -(-backups // num_states)
+
+    self.values = np.array(values).reshape(self.level.height,self.level.width)
+    self.backups += backup_solver.backups
+    return iterations
+
+
+  def run_to_convergence(self, max_iterations = 100, threshold = 1e-3, callback = None):
     ''' run multiple state sweeps until the maximum change in the state value falls
         below the supplied threshold or the maximum number of iterations is reached
+        - the change in value, number of backups and time of each sweep are recorded in a
+          'ConvergenceHistory', stored as 'convergence'
+        - if supplied, 'callback' is called with this history after each sweep and can
+          stop the run by returning True
     '''    
+    history = ConvergenceHistory( self.solver, threshold, callback )
+    self.convergence = history
+
+    if self.solver in ('gauss_seidel','prioritized'):
+      self.run_backup_solver( max_iterations, threshold, history )
+      return history.iterations
+
+    # every state except the exit is backed up in each sweep
+    backups = (self.level.width * self.level.height) - 1
+
     for n in range(max_iterations):
       
       # calculate the maximum action value in each state and get the largest state value difference
       delta = self.state_sweep()        
+      self.backups += backups
       
       # test if the difference is less than the defined convergence threshold
-      if delta < threshold:
+      if history.record( delta, backups ):
         break
     
     # return the number of iterations taken to converge
-    return n
\ No newline at end of file
+    return history.iterations
\ No newline at end of file
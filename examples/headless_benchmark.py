@@ -0,0 +1,44 @@
+# Copyright (c) Steve Roberts
+# Distributed under the terms of the Modified BSD License.
+
+''' Compare the number of steps per second of the standard and fast headless stepping paths
+    of the BabyRobot-v0 environment
+
+    usage: python headless_benchmark.py [num_steps]
+'''
+
+import sys
+import time
+import numpy as np
+import babyrobot
+
+
+def steps_per_second( num_steps, **setup ):
+  ''' time a random walk through the level '''
+  env = babyrobot.make("BabyRobot-v0", render_mode=None, **setup)
+  env = env.unwrapped
+  env.reset()
+
+  actions = np.random.randint(0, 5, num_steps).tolist()
+  start = time.perf_counter()
+  for action in actions:
+    obs, reward, terminated, truncated, info = env.step(action)
+    if terminated:
+      env.reset()
+  return num_steps / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+
+  num_steps = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+  levels = {
+    '8x8 puddles': {'width': 8, 'height': 8, 'puddles': [((2,2),1),((5,3),2),((3,6),2)]},
+    '50x50 maze': {'width': 50, 'height': 50, 'add_maze': True},
+  }
+
+  print(f"{'level':<14}{'standard':>14}{'fast_mode':>14}{'speedup':>10}")
+  for name, setup in levels.items():
+    standard = steps_per_second( num_steps, action_space='discrete', **setup )
+    fast = steps_per_second( num_steps, action_space='discrete', fast_mode=True, **setup )
+    print(f"{name:<14}{standard:>14,.0f}{fast:>14,.0f}{fast/standard:>9.1f}x")
@@ -39,5 +39,6 @@ setup(
     ],
     packages = find_packages(exclude=("tests",)),
     include_package_data=True,
-    install_requires=['gymnasium==0.27.0','ipycanvas==0.11','imageio==2.23.0','tqdm==4.64.0']    
+    install_requires=['gymnasium==0.27.0','ipycanvas==0.11','imageio==2.23.0','tqdm==4.64.0'],
+    extras_require={'solvers': ['scipy>=1.12']}
 )